@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Benchmark: time and peak memory of the cropbox correction
+
+Writes a synthetic PDFMiner XML file with pages whose CropBox differs
+from their MediaBox and corrects it
+
+- ``raw``: no correction at all (baseline: generating and writing)
+- ``tree``: as anapdf did before, parse the written file as a whole,
+  adjust every element and serialize the tree again
+- ``stream``: :meth:`anapdf.Analyzer.correct_cropbox` on every page
+  before it is written, as ``get_xml_data`` does now
+
+Every variant runs in a fresh process so that the peak resident set
+size (``ru_maxrss``) belongs to that variant alone.
+
+Usage::
+
+    python bench_cropbox.py [-n PAGES] [-l LINES]
+"""
+
+import os
+import sys
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+from lxml import etree as et
+
+from anapdf import Analyzer
+
+HEAD = b'<?xml version="1.0" encoding="UTF-8" ?>\n<pages>\n'
+FOOT = b'</pages>\n'
+
+def synthetic_pages(pages, lines):
+    """Yield the XML of ``pages`` pages with ``lines`` lines each"""
+    for pageno in range(1, pages + 1):
+        out = [b'<page id="%d" bbox="0.000,0.000,595.000,842.000" '
+               b'rotate="0" cropbox="0.000,0.000,555.000,802.000" '
+               b'cropboxraw="20.000,20.000,575.000,822.000">\n'
+               b'<textbox id="0" bbox="72.000,72.000,523.000,770.000">\n'
+               % pageno]
+        for line in range(lines):
+            y = 770.0 - line*12
+            out.append(b'<textline bbox="72.000,%.3f,523.000,%.3f">\n'
+                       % (y - 10, y))
+            for col in range(60):
+                x = 72.0 + col*7.5
+                out.append(
+                    b'<text font="Helvetica" bbox="%.3f,%.3f,%.3f,%.3f" '
+                    b'colourspace="DeviceGray" ncolour="0" size="10.000">'
+                    b'%s</text>\n' % (x, y - 10, x + 7.5, y,
+                                      b"abcdefghij"[col % 10:col % 10 + 1]))
+            out.append(b'<text>\n</text>\n</textline>\n')
+        out.append(b'</textbox>\n<layout>\n</layout>\n</page>\n')
+        yield b"".join(out)
+
+def tree_correction(analyzer, xmlfile):
+    """The former whole-file correction of ``Analyzer.get_xml_data``"""
+    doc = et.parse(xmlfile)
+    for page in doc.getroot():
+        if "cropbox" in page.attrib:
+            mx0, my0, mx1, my1 = [
+                float(x) for x in page.get("bbox").split(",")]
+            cx0, cy0, cx1, cy1 = [
+                float(x) for x in page.get("cropboxraw").split(",")]
+            page.set("bbox", page.get("cropbox", ""))
+            for e in page.iterdescendants():
+                analyzer.adjust_coords(e, mx0 - cx0, my0 - cy0)
+    with open(xmlfile, "wb") as outfile:
+        outfile.write(et.tostring(doc, encoding="UTF-8"))
+
+def run_variant(variant, pages, lines):
+    # correct_cropbox and adjust_coords need no PDF file
+    analyzer = Analyzer.__new__(Analyzer)
+    page_filter = None
+    if variant == "stream":
+        page_filter = analyzer.correct_cropbox
+    xmlfile = os.path.join(tempfile.mkdtemp(), "bench.xml")
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    with open(xmlfile, "wb") as outfp:
+        outfp.write(HEAD)
+        for xml in synthetic_pages(pages, lines):
+            if page_filter is not None:
+                xml = page_filter(xml)
+            outfp.write(xml)
+        outfp.write(FOOT)
+    if variant == "tree":
+        tree_correction(analyzer, xmlfile)
+    elapsed = time.time() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    size = os.path.getsize(xmlfile)
+    os.remove(xmlfile)
+    print("{:<8} pages: {:5d}  XML: {:8.1f} MB  time: {:7.2f} s  "
+          "peak RSS: {:8.1f} MB  (+{:.1f} MB over baseline)".format(
+              variant, pages, size/2.0**20, elapsed, peak/1024.0,
+              (peak - before)/1024.0))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-n", "--pages", type=int, default=1000)
+    parser.add_argument("-l", "--lines", type=int, default=40)
+    parser.add_argument("--variant", choices=("raw", "tree", "stream"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.variant:
+        run_variant(args.variant, args.pages, args.lines)
+        return
+    for variant in ("raw", "tree", "stream"):
+        subprocess.check_call([
+            sys.executable, __file__,
+            "-n", str(args.pages), "-l", str(args.lines),
+            "--variant", variant])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Benchmark: time and peak memory of collecting the font index
+
+Writes a synthetic PDFMiner XML file (see ``bench_cropbox.py``) and
+collects the first occurrence of every character in every font
+
+- ``tree``: as anapdf did before, parse the file as a whole, query
+  ``//page`` and ``.//text`` and walk all textlines for their tags
+- ``stream``: :meth:`anapdf.Analyzer.collect_fonts`, one pass with
+  ``iterparse`` clearing every page after use
+
+Every variant runs in a fresh process so that the peak resident set
+size (``ru_maxrss``) belongs to that variant alone.
+
+Usage::
+
+    python bench_font_index.py [-n PAGES] [-l LINES]
+"""
+
+import os
+import sys
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+from lxml import etree as et
+
+from anapdf import Analyzer
+from bench_cropbox import synthetic_pages, HEAD, FOOT
+
+def tree_collect(analyzer, xmlfile):
+    """The former ``Analyzer.collect_fonts`` and ``write_font_index``"""
+    doc = et.parse(xmlfile)
+    fonts = {}
+    imgcount = 0
+    for page in doc.xpath("//page"):
+        current_page = page.get("id")
+        for text in page.xpath(".//text"):
+            font = text.get("font")
+            if font is None:
+                continue
+            letters = fonts.setdefault(font, {})
+            letterref = (text.text or "", text.get("cid", ""))
+            if letterref[0] in ("\n", "\r", "\r\n", "\n\r") \
+                    or letterref in letters:
+                continue
+            letters[letterref] = {
+                "bbox": analyzer.blow_up_bbox(text.get("bbox")),
+                "page": int(current_page),
+                "img": imgcount,
+                "sc": False,
+                "linebox": analyzer.blow_up_bbox(
+                    text.getparent().get("bbox", ""))}
+            imgcount += 1
+    tags = set()
+    for tl in doc.xpath("//textline"):
+        for e in tl:
+            tags.add(e.tag)
+    return fonts
+
+def run_variant(variant, pages, lines):
+    # collect_fonts needs no PDF file
+    analyzer = Analyzer.__new__(Analyzer)
+    analyzer.scales = (100.0, 100.0)
+    xmlfile = os.path.join(tempfile.mkdtemp(), "bench.xml")
+    with open(xmlfile, "wb") as outfp:
+        outfp.write(HEAD)
+        for xml in synthetic_pages(pages, lines):
+            outfp.write(xml)
+        outfp.write(FOOT)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    if variant == "tree":
+        fonts = tree_collect(analyzer, xmlfile)
+    else:
+        fonts = analyzer.collect_fonts(xmlfile)
+    elapsed = time.time() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    size = os.path.getsize(xmlfile)
+    os.remove(xmlfile)
+    print("{:<8} pages: {:5d}  XML: {:8.1f} MB  letters: {:4d}  "
+          "time: {:7.2f} s  peak RSS: {:8.1f} MB  (+{:.1f} MB)".format(
+              variant, pages, size/2.0**20,
+              sum(len(letters) for letters in fonts.values()), elapsed,
+              peak/1024.0, (peak - before)/1024.0))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-n", "--pages", type=int, default=1000)
+    parser.add_argument("-l", "--lines", type=int, default=40)
+    parser.add_argument("--variant", choices=("tree", "stream"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.variant:
+        run_variant(args.variant, args.pages, args.lines)
+        return
+    for variant in ("tree", "stream"):
+        subprocess.check_call([
+            sys.executable, __file__,
+            "-n", str(args.pages), "-l", str(args.lines),
+            "--variant", variant])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Benchmark: encode time and size of page images per format and setting
+
+Every page of the sample is rendered once; then each setting encodes
+all pages in memory with :meth:`anapdf.render.PageRenderer.save`, i.e.
+with the same options ``anapdf`` uses.
+
+Usage::
+
+    python bench_formats.py PDFFILE [-r RESOLUTION] [-n PAGES]
+"""
+
+import io
+import time
+import argparse
+
+import fitz
+
+from anapdf.render import PageRenderer, pixmap_to_image
+
+# (label, PageRenderer settings, PIL mode of the encoded image)
+SETTINGS = [
+    ("jpeg q75", dict(image_format="jpeg", quality=75), "RGB"),
+    ("jpeg q85", dict(image_format="jpeg", quality=85), "RGB"),
+    ("jpeg q95", dict(image_format="jpeg", quality=95), "RGB"),
+    ("jpeg q85 optimize", dict(image_format="jpeg", optimize=True), "RGB"),
+    ("jpeg q85 progressive",
+        dict(image_format="jpeg", progressive=True), "RGB"),
+    ("png level 1", dict(image_format="png", compress_level=1), "RGB"),
+    ("png level 6", dict(image_format="png", compress_level=6), "RGB"),
+    ("png level 9", dict(image_format="png", compress_level=9), "RGB"),
+    ("webp q80", dict(image_format="webp", quality=80), "RGB"),
+    ("webp q90 method 6",
+        dict(image_format="webp", quality=90, compress_level=6), "RGB"),
+    ("tiff lzw", dict(image_format="tiff"), "RGB"),
+    ("tiff group4 (bitonal)", dict(image_format="tiff"), "1"),
+]
+
+def render(pdffile, resolution, pages):
+    pdf = fitz.open(pdffile)
+    images = []
+    for idx in range(min(pages, pdf.page_count)):
+        pix = pdf.get_page_pixmap(
+            idx, matrix=fitz.Matrix(resolution/72.0, resolution/72.0),
+            colorspace="RGB", alpha=False)
+        images.append(pixmap_to_image(pix).copy())
+    return images
+
+def convert(im, mode):
+    if mode == "1":
+        return im.convert("L").point(lambda v: 255 if v > 127 else 0, "1")
+    return im.convert(mode)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("pdffile", metavar="PDFFILE")
+    parser.add_argument("-r", "--resolution", type=int, default=300)
+    parser.add_argument("-n", "--pages", type=int, default=10)
+    args = parser.parse_args()
+    images = render(args.pdffile, args.resolution, args.pages)
+    print("{} pages at {} dpi".format(len(images), args.resolution))
+    print("{:<24} {:>12} {:>14}".format(
+        "setting", "ms/page", "KiB/page"))
+    for label, settings, mode in SETTINGS:
+        renderer = PageRenderer(
+            args.pdffile, ".", resolution=args.resolution, **settings)
+        pages = [convert(im, mode) for im in images]
+        size = 0
+        start = time.time()
+        for im in pages:
+            buf = io.BytesIO()
+            renderer.save(im, buf)
+            size += buf.tell()
+        elapsed = time.time() - start
+        print("{:<24} {:>12.1f} {:>14.1f}".format(
+            label, elapsed/len(pages)*1000, size/len(pages)/1024.0))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Benchmark: XML extraction time per layout analysis mode
+
+Extracts the first pages of a PDF file with PDFMiner for every mode of
+:data:`anapdf.extraction.LAYOUTS` and reports the time per page and
+the number of text boxes, text lines and characters found. The
+grouping of the text boxes skipped by ``lines`` and ``grid`` costs
+more than linearly with the number of boxes per page; pages with one
+or two columns of running text hardly gain, tables and scattered text
+a lot (50 x 8 table cells per page: 0.99 s/page with ``full``, 0.17
+s/page with ``lines``, 0.16 s/page with ``grid``).
+
+Usage::
+
+    python bench_layout.py PDFFILE [-n PAGES]
+"""
+
+import time
+import argparse
+
+from lxml import etree as et
+
+from anapdf.extraction import extract_pages, make_laparams, LAYOUTS, \
+        PageExtractor
+
+def run(pdffile, indexes, layout):
+    laparams = make_laparams(layout)
+    counts = {"textbox": 0, "textline": 0, "text": 0}
+    elapsed = 0.0
+    start = time.time()
+    for idx, xml, metrics in extract_pages(
+            pdffile, indexes, laparams=laparams):
+        elapsed += time.time() - start
+        page = et.fromstring(xml)
+        for tag in counts:
+            counts[tag] += len(page.xpath("./textbox//" + tag
+                                          if tag != "textbox"
+                                          else "./textbox"))
+        start = time.time()
+    return elapsed, counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("pdffile", metavar="PDFFILE")
+    parser.add_argument("-n", "--pages", type=int, default=20)
+    args = parser.parse_args()
+    extractor = PageExtractor(args.pdffile)
+    indexes = range(min(args.pages, extractor.page_count))
+    extractor.close()
+    print("{} pages".format(len(indexes)))
+    print("{:<8} {:>10} {:>10} {:>10} {:>10}".format(
+        "layout", "s/page", "textboxes", "textlines", "chars"))
+    for layout in sorted(LAYOUTS):
+        elapsed, counts = run(args.pdffile, indexes, layout)
+        print("{:<8} {:>10.3f} {:>10} {:>10} {:>10}".format(
+            layout, elapsed/len(indexes), counts["textbox"],
+            counts["textline"], counts["text"]))
+
+if __name__ == "__main__":
+    main()
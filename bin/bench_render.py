@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Benchmark: peak memory of page rendering
+
+Compares the former pixmap -> ``samples`` -> ``Image.frombytes`` path
+with :func:`anapdf.render.pixmap_to_image`, which hands the pixmap
+buffer to PIL as a memoryview.
+
+Every variant runs in a fresh process so that the peak resident set
+size (``ru_maxrss``) belongs to that variant alone.
+
+Usage::
+
+    python bench_render.py PDFFILE [-r RESOLUTION] [-n PAGES]
+"""
+
+import os
+import sys
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+import fitz
+from PIL import Image
+
+from anapdf.render import pixmap_to_image
+
+
+def render_copy(pdf, idx, resolution, outname):
+    pix = pdf.get_page_pixmap(
+        idx, matrix=fitz.Matrix(resolution/72.0, resolution/72.0),
+        colorspace="RGB", alpha=False)
+    im = Image.frombytes("RGB", [pix.w, pix.h], pix.samples)
+    im.save(outname, "JPEG", dpi=(resolution, resolution), quality=85)
+
+def render_view(pdf, idx, resolution, outname):
+    pix = pdf.get_page_pixmap(
+        idx, matrix=fitz.Matrix(resolution/72.0, resolution/72.0),
+        colorspace="RGB", alpha=False)
+    im = pixmap_to_image(pix)
+    im.save(outname, "JPEG", dpi=(resolution, resolution), quality=85)
+    del im
+
+VARIANTS = {"copy": render_copy, "memoryview": render_view}
+
+def run_variant(variant, pdffile, resolution, pages):
+    pdf = fitz.open(pdffile)
+    pages = min(pages, pdf.page_count)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    outname = os.path.join(tempfile.mkdtemp(), "bench.jpg")
+    start = time.time()
+    for idx in range(pages):
+        VARIANTS[variant](pdf, idx, resolution, outname)
+    elapsed = time.time() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    os.remove(outname)
+    print("{:<12} pages: {:4d}  time/page: {:7.3f} s  "
+          "peak RSS: {:8.1f} MB  (+{:.1f} MB over baseline)".format(
+              variant, pages, elapsed/pages, peak/1024.0,
+              (peak - before)/1024.0))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("pdffile", metavar="PDFFILE")
+    parser.add_argument("-r", "--resolution", type=int, default=300)
+    parser.add_argument("-n", "--pages", type=int, default=10)
+    parser.add_argument("--variant", choices=sorted(VARIANTS),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.variant:
+        run_variant(args.variant, args.pdffile, args.resolution, args.pages)
+        return
+    for variant in ("copy", "memoryview"):
+        subprocess.check_call([
+            sys.executable, __file__, args.pdffile,
+            "-r", str(args.resolution), "-n", str(args.pages),
+            "--variant", variant])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Benchmark: time of page images plus font index per snippet source
+
+Extracts the XML of a PDF file once, then renders all page images and
+writes the font index into fresh directories with
+
+- ``images``: :meth:`anapdf.Analyzer.images`, then
+  :meth:`anapdf.Analyzer.extract_fonts` reading every page image with
+  snippets back (``--snippets images``)
+- ``render``: the snippets are cropped from the page images while
+  they are rendered, no page image is decoded (``--snippets render``)
+
+and reports the time of both stages and the time saved.
+
+Usage::
+
+    python bench_snippet_render.py PDFFILE [-r RESOLUTION] [-j JOBS]
+"""
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+from anapdf import Analyzer
+
+def run(pdffile, xmlfile, resolution, workers, source):
+    directory = tempfile.mkdtemp()
+    try:
+        analyzer = Analyzer(
+                pdffile=pdffile,
+                outfilename=xmlfile,
+                imdir=os.path.join(directory, "im"),
+                fontdir=os.path.join(directory, "fonts"),
+                resolution=resolution,
+                workers=workers,
+                snippet_source=source,
+                extract_xml_data=False)
+        start = time.time()
+        analyzer.analyze()
+        return time.time() - start
+    finally:
+        shutil.rmtree(directory)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("pdffile", metavar="PDFFILE")
+    parser.add_argument("-r", "--resolution", type=int, default=300)
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+    try:
+        xmlfile = os.path.join(directory, "bench.xml")
+        Analyzer(pdffile=args.pdffile, outfilename=xmlfile,
+                 imdir=os.path.join(directory, "im"),
+                 make_images=False, extract_fonts=False,
+                 cache=False).analyze()
+        elapsed = {}
+        for source in ("images", "render"):
+            elapsed[source] = run(args.pdffile, xmlfile, args.resolution,
+                                  args.jobs, source)
+            print("{:<8} images + font index: {:7.2f} s".format(
+                source, elapsed[source]))
+        print("saved: {:.2f} s ({:.0f} %)".format(
+            elapsed["images"] - elapsed["render"],
+            100.0*(elapsed["images"] - elapsed["render"])
+            / elapsed["images"]))
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    main()
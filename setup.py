@@ -46,7 +46,8 @@ setup_args = dict(
         packages=find_packages("src"),
         entry_points={"console_scripts":
             ["anapdf=anapdf.scripts.anapdf_script:main",
-                "pdf2tei=anapdf.scripts.pdf2tei_script:main"],},
+                "pdf2tei=anapdf.scripts.pdf2tei_script:main",
+                "anapdf-compare=anapdf.scripts.compare_script:main"],},
         keywords = "pdf images fonts",
         classifiers=[
             "License :: OSI Approved :: MIT License",
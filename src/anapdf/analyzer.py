@@ -6,16 +6,24 @@ Analyzer for PDF files
 """
 
 import os.path
+import shutil
 import logging
+import tempfile
+import multiprocessing
 
 from lxml import etree as et
 # from pdfimages import PDFImagesDocument
-import fitz
-from PIL import Image, ImageDraw
-from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
-from pdfminer.converter import XMLConverter
 from pdfminer.layout import LAParams
-from pdfminer.pdfpage import PDFPage
+
+from .render import PageRenderer, RenderManifest
+from .render import IMAGE_FORMATS, COLORMODES
+from .render import render_pages, file_digest
+from .tiles import PYRAMIDS
+from .extraction import extract_xml, parse_font_metrics, ENGINES
+from .extraction import make_laparams, LAYOUTS, PageBudget
+from .cache import extraction_cache, extraction_key
+from .journal import ExtractionJournal
+from .snippets import write_page_snippets, pack_atlas, PageSnippetWriter
 
 HTML_HEAD = u"""\
 <!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Strict//EN" "http://www.w3.org/TR/xhtml1/DTD/xhtml1-strict.dtd">
@@ -69,16 +77,51 @@ class Analyzer(object):
     imdir = ""
     fontdir = ""
     resolution = 0
+    image_format = "jpeg"  # see render.IMAGE_FORMATS
+    quality = 85
+    compress_level = None
+    colormode = "rgb"  # see render.COLORMODES
+    memory_limit = None  # MB per page pixmap, larger pages are tiled
+    pyramid = None  # "dzi" or "iiif" tile pyramid in imdir/tiles
+    tile_size = 256
+    thumbnail_size = None
+    iiif_base_url = ""
+    workers = 1  # number of processes for page rendering and extraction
     font_correctors = None  # list of FontCorrectors
+    font_corrector_filename = None  # module the correctors are from
     font_metrics = None  # some metrics for each font;
-                         # this dict will only be populated if
-                         # xml data is being extracted
+                         # from the extraction or the <fonts>
+                         # section of the XML file
     scales = (100.0, 100.0)
 
     b_make_images = True
     b_extract_xml_data = True
     b_extract_fonts = True
     b_cropbox_correction = True
+    b_force_images = False
+    b_optimize = False
+    b_progressive = False
+    b_embedded_images = False
+    snippet_source = "images"  # "images": crop from page images,
+                               # "render": crop while rendering them,
+                               # "pdf": render clip rectangles from PDF
+    snippet_resolution = 0
+    b_font_pages_first = False
+    b_remaining_images = False
+    b_atlas = False  # snippets of a font packed into one image
+    b_split_index = False  # one HTML page per font, index.htm as TOC
+    b_cache = True  # use the extraction cache
+    cache_dir = None  # None: default cache directory
+    cache_size = None  # MB, None: default maximum size
+    engine = "pdfminer"  # XML extraction: "pdfminer" or "pymupdf"
+    layout = "full"  # layout analysis mode, see extraction.LAYOUTS
+    laparams = None  # LAParams of the extraction
+    page_timeout = None  # seconds per page, None: no limit
+    page_memory = None  # MB per extraction worker, None: no limit
+    b_retry_pages = True  # retry pages over budget with layout "grid"
+    failed_pages = None  # [(idx, status, recovered)] of the extraction
+    b_journal = True  # journal extracted pages, resume an interrupted run
+    b_discard_journal = False  # ignore the journal of a previous run
 
     def __init__(self, **kwargs):
         self.pdffile = kwargs.get("pdffile")
@@ -96,6 +139,43 @@ class Analyzer(object):
         if not os.path.isdir(self.fontdir):
             os.makedirs(self.fontdir)
         self.resolution = kwargs.get("resolution", 300)
+        self.workers = kwargs.get("workers", 1)
+        self.image_format = kwargs.get("image_format", "jpeg")
+        if self.image_format not in IMAGE_FORMATS:
+            raise PDFAnalyzerError(
+                "Unknown image format: {}".format(self.image_format))
+        self.quality = kwargs.get("quality", 85)
+        self.compress_level = kwargs.get("compress_level")
+        self.b_optimize = kwargs.get("optimize", False)
+        self.b_progressive = kwargs.get("progressive", False)
+        self.colormode = kwargs.get("colormode", "rgb")
+        self.b_embedded_images = kwargs.get("embedded_images", False)
+        self.memory_limit = kwargs.get("memory_limit")
+        if self.memory_limit and self.image_format != "png":
+            raise PDFAnalyzerError(
+                "A memory limit needs PNG page images (--format png), "
+                "not {}".format(self.image_format))
+        self.pyramid = kwargs.get("pyramid")
+        if self.pyramid is not None and self.pyramid not in PYRAMIDS:
+            raise PDFAnalyzerError(
+                "Unknown pyramid: {}".format(self.pyramid))
+        self.tile_size = kwargs.get("tile_size", 256)
+        self.thumbnail_size = kwargs.get("thumbnail_size")
+        self.iiif_base_url = kwargs.get("iiif_base_url", "")
+        if self.colormode not in COLORMODES:
+            raise PDFAnalyzerError(
+                "Unknown colormode: {}".format(self.colormode))
+        self.b_force_images = kwargs.get("force_images", False)
+        self.snippet_source = kwargs.get("snippet_source", "images")
+        if self.snippet_source not in ("images", "render", "pdf"):
+            raise PDFAnalyzerError(
+                "Unknown snippet source: {}".format(self.snippet_source))
+        self.snippet_resolution = kwargs.get("snippet_resolution") \
+                or self.resolution
+        self.b_font_pages_first = kwargs.get("font_pages_first", False)
+        self.b_remaining_images = kwargs.get("remaining_images", False)
+        self.b_atlas = kwargs.get("atlas", False)
+        self.b_split_index = kwargs.get("split_index", False)
         self.b_make_images = kwargs.get("make_images", True)
         self.b_extract_xml_data = kwargs.get("extract_xml_data", True)
         self.b_extract_fonts = kwargs.get("extract_fonts", True)
@@ -104,11 +184,51 @@ class Analyzer(object):
         if font_correctors is not None:
             for fc in font_correctors:
                 self.font_correctors.append(fc)
+        self.font_corrector_filename = kwargs.get("font_corrector_filename")
+        self.engine = kwargs.get("engine", "pdfminer")
+        if self.engine not in ENGINES:
+            raise PDFAnalyzerError(
+                "Unknown engine: {}".format(self.engine))
+        if self.font_correctors and self.engine != "pdfminer":
+            raise PDFAnalyzerError(
+                "Font correctors need the pdfminer engine.")
+        self.layout = kwargs.get("layout", "full")
+        if self.layout not in LAYOUTS:
+            raise PDFAnalyzerError(
+                "Unknown layout: {}".format(self.layout))
+        laparams = kwargs.get("laparams")
+        if isinstance(laparams, LAParams):
+            self.laparams = laparams
+        else:
+            try:
+                self.laparams = make_laparams(self.layout, **(laparams or {}))
+            except (TypeError, ValueError) as e:
+                raise PDFAnalyzerError(
+                    "Invalid layout parameters: {}".format(e))
+        self.b_cache = kwargs.get("cache", True)
+        self.cache_dir = kwargs.get("cache_dir")
+        self.cache_size = kwargs.get("cache_size")
+        self.page_timeout = kwargs.get("page_timeout")
+        self.page_memory = kwargs.get("page_memory")
+        self.b_retry_pages = kwargs.get("retry_pages", True)
+        self.b_journal = kwargs.get("journal", True)
+        self.b_discard_journal = kwargs.get("discard_journal", False)
         self.scales = kwargs.get("scales", (100.0, 100.0))
         self.b_cropbox_correction = kwargs.get("cropbox_correction", True)
 
     def analyze(self):
         """Start the program suite"""
+        if self.snippet_source == "render" and self.b_make_images \
+                and self.b_extract_fonts:
+            # the pages are rendered while the font index is written
+            if self.b_extract_xml_data:
+                self.get_xml_data()
+            self.extract_fonts()
+            return
+        if self.b_font_pages_first and self.b_make_images \
+                and self.b_extract_fonts:
+            self._analyze_font_pages_first()
+            return
         if self.b_make_images:
             self.images()
         if self.b_extract_xml_data:
@@ -116,42 +236,105 @@ class Analyzer(object):
         if self.b_extract_fonts:
             self.extract_fonts()
 
-    def images(self):
-        """Create the images"""
-        # pdf = PDFImagesDocument(self.pdffile)
-        pdf = fitz.open(self.pdffile)
-        # num_pages = pdf.count_pages()
-        # num_pages = pdf.pageCount
-        num_pages = pdf.page_count
+    def _analyze_font_pages_first(self):
+        """Extract the XML data, then render only the pages needed for
+        the font index, optionally the remaining pages in the background
+        while the font index is written.
+        """
+        if self.b_extract_xml_data:
+            self.get_xml_data()
+        pages = self.font_index_pages(self.xmlfile)
+        logging.info("Rendering %d pages for the font index", len(pages))
+        self.images([p - 1 for p in pages])
+        background = None
+        if self.b_remaining_images:
+            # not the font index pages, they are read meanwhile (and
+            # would be rendered again with force_images)
+            done = set(pages)
+            remaining = [idx for idx in range(self.page_count())
+                         if idx + 1 not in done]
+            background = multiprocessing.Process(
+                    target=self.images, args=(remaining,))
+            background.start()
+        self.extract_fonts()
+        if background is not None:
+            background.join()
+
+    def page_count(self):
+        """Number of pages of the PDF file"""
+        renderer = PageRenderer(**self.render_settings())
+        try:
+            return renderer.open().page_count
+        finally:
+            renderer.close()
+
+    def render_settings(self):
+        """Keyword arguments for :class:`PageRenderer`"""
+        return dict(
+                pdffile=self.pdffile,
+                imdir=self.imdir,
+                resolution=self.resolution,
+                image_format=self.image_format,
+                quality=self.quality,
+                compress_level=self.compress_level,
+                optimize=self.b_optimize,
+                progressive=self.b_progressive,
+                colormode=self.colormode,
+                embedded=self.b_embedded_images,
+                memory_limit=self.memory_limit,
+                pyramid=self.pyramid,
+                tile_size=self.tile_size,
+                thumbnail_size=self.thumbnail_size,
+                iiif_base_url=self.iiif_base_url)
+
+    def images(self, indexes=None, on_image=None):
+        """Create the images
+
+        Args:
+            indexes (list): indexes (0-based) of the pages to render,
+                leave empty to render all pages
+            on_image: called with every rendered page image, see
+                :meth:`anapdf.render.PageRenderer.render`
+
+        Pages whose image in ``imdir`` is recorded in the manifest as
+        rendered from the same PDF with the same settings are skipped,
+        unless ``force_images`` is set. Returns the indexes of the
+        rendered pages.
+        """
+        settings = self.render_settings()
+        renderer = PageRenderer(**settings)
+        manifest = RenderManifest(self.imdir)
+        pdf_digest = file_digest(self.pdffile)
+        if indexes is None:
+            indexes = range(0, self.page_count())
+        pending = []
+        for idx in indexes:
+            name = os.path.basename(renderer.image_name(idx))
+            if self.b_force_images or not manifest.is_current(
+                    name, renderer.manifest_entry(idx, pdf_digest)):
+                pending.append(idx)
+        if len(pending) < len(indexes):
+            logging.info("  %d/%d images up to date",
+                    len(indexes) - len(pending), len(indexes))
         cnt = 1
-        for idx in range(0, num_pages):
-            imdata = pdf.get_page_pixmap(
-                    idx,
-                    matrix=fitz.Matrix(
-                        float(self.resolution)/72,
-                        float(self.resolution)/72
-                    ),
-                    colorspace="RGB",
-                    alpha=False
-                )
-            im = Image.frombytes(
-                    "RGB",
-                    [imdata.w, imdata.h],
-                    imdata.samples
-                )
-            basename = os.path.splitext(os.path.basename(self.pdffile))[0]
-            name = "{}_{:05d}.jpg".format(basename, cnt)
-            name = os.path.join(self.imdir, name)
-            im.save(name, dpi=(self.resolution, self.resolution), quality=85)
-            if not(cnt % 10):
-                logging.info("  %d/%d", cnt + 1, num_pages)
-            cnt += 1
+        try:
+            for idx, name, info in render_pages(
+                    pending, workers=self.workers, on_image=on_image,
+                    **settings):
+                manifest.update(os.path.basename(name),
+                        renderer.manifest_entry(idx, pdf_digest), info)
+                if not(cnt % 10):
+                    logging.info("  %d/%d", cnt + 1, len(pending))
+                    manifest.save()
+                cnt += 1
+        finally:
+            manifest.save()
+        return pending
 
     def extract_fonts(self):
         """Create HTML with all characters and images"""
-        doc = et.parse(self.xmlfile)
         with open(os.path.join(self.fontdir, "index.htm"), "wb") as outfile:
-            self.write_font_index(outfile, doc)
+            self.write_font_index(outfile, self.xmlfile)
 
     def blow_up_bbox(self, bbox, scales=None):
         """
@@ -178,14 +361,28 @@ class Analyzer(object):
     def _is_smallcaps(self, glyphname):
         return glyphname.strip().lower().endswith(".sc")
 
-    def write_font_index(self, outfile, doc):
-        """Write font information into HMTL file"""
-        outfile.write(HTML_HEAD.encode("UTF-8"))
+    def collect_fonts(self, xmlfile):
+        """Collect the first occurrence of every character in every font
+
+        Returns a dict ``{font: {(char, cid): letter}}``, where ``letter``
+        is a dict with the keys ``bbox``, ``page``, ``img``, ``sc`` and
+        ``linebox``.
+
+        ``xmlfile`` is read page by page, only one ``<page>`` element is
+        held in memory at a time. If :attr:`font_metrics` is ``None``
+        (no extraction in this run), they are read from the ``<fonts>``
+        section of the file.
+        """
         fonts = {}
         imgcount = 0
-        for page in doc.xpath("//page"):
+        for _, page in et.iterparse(xmlfile, tag=("page", "fonts")):
+            if page.tag == "fonts":
+                if self.font_metrics is None:
+                    self.font_metrics = parse_font_metrics(page)
+                page.clear()
+                continue
             current_page = page.get("id")
-            for text in page.xpath(".//text"):
+            for text in page.iter("text"):
                 font = text.get("font")
                 if font is not None:
                     if fonts.get(font, None) is None:
@@ -207,18 +404,41 @@ class Analyzer(object):
                                     "sc": self._is_smallcaps(glyphname),
                                     "linebox": lbox}
                             imgcount += 1
-        tags = set()
-        for tl in doc.xpath("//textline"):
-            for e in tl:
-                tags.add(e.tag)
+            # the page and the pages before it are done
+            page.clear()
+            while page.getprevious() is not None:
+                del page.getparent()[0]
+        return fonts
+
+    def font_index_pages(self, xmlfile):
+        """Sorted list of the pages (ids) the font index crops from"""
+        pages = set()
+        for letters in self.collect_fonts(xmlfile).values():
+            for letter in letters.values():
+                pages.add(letter["page"])
+        return sorted(pages)
+
+    def write_font_index(self, outfile, xmlfile):
+        """Write font information of ``xmlfile`` into HMTL file"""
+        outfile.write(HTML_HEAD.encode("UTF-8"))
+        fonts = self.collect_fonts(xmlfile)
         fontnames = list(fonts.keys())
         fontnames.sort()
-        pages = {}
+        outdir = os.path.join(self.fontdir, "pic")
+        if not os.path.isdir(outdir):
+            os.makedirs(outdir)
+        if self.b_atlas:
+            atlas = self.write_atlases(fonts, fontnames, outdir)
+        else:
+            atlas = None
+            self.write_font_snippets(fonts, fontnames, outdir)
         # build toc
         fontcount = 0
         outfile.write(("<p>\n").encode("UTF-8"))
         for font in fontnames:
-            outfile.write("<a href=\"#f{}\">{}</a><br/>\n"
+            # one page per font or anchors in this page
+            href = "font{}.htm" if self.b_split_index else "#f{}"
+            outfile.write(("<a href=\"" + href + "\">{}</a><br/>\n")
                     .format(fontcount, font).encode("UTF-8"))
             if self.font_metrics is not None:
                 fm = self.font_metrics.get(font)
@@ -229,179 +449,206 @@ class Analyzer(object):
                             .format(fm["bbox"], fm["descent"]).encode("UTF-8"))
             fontcount += 1
         outfile.write(("\n</p>\n").encode("UTF-8"))
-        fontcount = 0
-        for font in fontnames:
-            basefontname = font
-            pos = basefontname.find("+")
-            if pos != -1:
-                basefontname = basefontname[pos + 1:]
-            outfile.write(("<h1 id=\"f" + str(fontcount) +
-                "\">" + font + "</h1>\n").encode("UTF-8"))
-            fontcount += 1
-            # font metrics
-            if self.font_metrics is not None:
-                fm = self.font_metrics.get(font)
-                if fm is not None:
-                    outfile.write(u"<p class=\"fontmetrics\">\n".encode("UTF-8"))
-                    outfile.write(
-                            u"BBox: {}<br/>\n"
-                            .format(fm["bbox"]).encode("UTF-8"))
-                    outfile.write(
-                            u"Descent: {}<br/>\n"
-                            .format(fm["descent"]).encode("UTF-8"))
-                    outfile.write("\n</p>\n".encode("UTF-8"))
-            chars = list(fonts[font].keys())
-            chars.sort()
-            outfile.write(u"<table>\n".encode("UTF-8"))
-            styles = []
-            if "bold" in basefontname.lower():
-                styles.append("bold")
-            if "italic" in basefontname.lower():
-                styles.append("italics")
-            if "SC" in basefontname or "smallcaps" in basefontname.lower():
-                styles.append("sc")
-            style = " ".join(styles).strip()
-            for char in chars:
-                letterstyle = style
-                if fonts[font][char]["sc"]:
-                    if letterstyle:
-                        letterstyle += " sc"
-                    else:
-                        letterstyle += "sc"
-                bbox = [float(x) for x in fonts[font][char]["bbox"].split(",")]
-                width = int((bbox[2] - bbox[0])/72*self.resolution)
-                height = int((bbox[3] - bbox[1])/72*self.resolution)
-                outfile.write(u"<tr>\n".encode("UTF-8"))
-                outfile.write((u"<td class=\"" + letterstyle + "\">" + self._escape(char[0]) + "</td>\n").encode("UTF-8"))
-                outfile.write((u"<td><img alt=\"outpic%d\" src=\"pic/outpic" % fonts[font][char]["img"]).encode("UTF-8"))
+        for fontcount, font in enumerate(fontnames):
+            if self.b_split_index:
+                with open(os.path.join(self.fontdir, "font%d.htm"
+                                       % fontcount), "wb") as fontfile:
+                    fontfile.write(HTML_HEAD.encode("UTF-8"))
+                    self.write_font_section(
+                            fontfile, fonts, font, fontcount, atlas,
+                            lazy=True)
+                    fontfile.write(HTML_FOOT.encode("UTF-8"))
+            else:
+                self.write_font_section(
+                        outfile, fonts, font, fontcount, atlas)
+        outfile.write(HTML_FOOT.encode("UTF-8"))
+        outfile.close()
+
+    def write_font_section(self, outfile, fonts, font, fontcount,
+                           atlas=None, lazy=False):
+        """Write heading, metrics and table of ``font`` (number
+        ``fontcount`` in the index) to ``outfile``
+
+        ``atlas`` are the snippet positions from :meth:`write_atlases`,
+        if any; with ``lazy``, the images are loaded lazily.
+        """
+        lazy = u" loading=\"lazy\"" if lazy else u""
+        basefontname = font
+        pos = basefontname.find("+")
+        if pos != -1:
+            basefontname = basefontname[pos + 1:]
+        outfile.write(("<h1 id=\"f" + str(fontcount) +
+            "\">" + font + "</h1>\n").encode("UTF-8"))
+        # font metrics
+        if self.font_metrics is not None:
+            fm = self.font_metrics.get(font)
+            if fm is not None:
+                outfile.write(u"<p class=\"fontmetrics\">\n".encode("UTF-8"))
+                outfile.write(
+                        u"BBox: {}<br/>\n"
+                        .format(fm["bbox"]).encode("UTF-8"))
+                outfile.write(
+                        u"Descent: {}<br/>\n"
+                        .format(fm["descent"]).encode("UTF-8"))
+                for key, label in (("ascent", u"Ascent"),
+                                   ("italic_angle", u"Italic angle"),
+                                   ("flags", u"Flags")):
+                    if key in fm:
+                        outfile.write(
+                                u"{}: {}<br/>\n"
+                                .format(label, fm[key]).encode("UTF-8"))
+                outfile.write("\n</p>\n".encode("UTF-8"))
+        chars = list(fonts[font].keys())
+        chars.sort()
+        outfile.write(u"<table>\n".encode("UTF-8"))
+        styles = []
+        if "bold" in basefontname.lower():
+            styles.append("bold")
+        if "italic" in basefontname.lower():
+            styles.append("italics")
+        if "SC" in basefontname or "smallcaps" in basefontname.lower():
+            styles.append("sc")
+        style = " ".join(styles).strip()
+        for char in chars:
+            letterstyle = style
+            if fonts[font][char]["sc"]:
+                if letterstyle:
+                    letterstyle += " sc"
+                else:
+                    letterstyle += "sc"
+            bbox = [float(x) for x in fonts[font][char]["bbox"].split(",")]
+            width = int((bbox[2] - bbox[0])/72*self.resolution)
+            height = int((bbox[3] - bbox[1])/72*self.resolution)
+            outfile.write(u"<tr>\n".encode("UTF-8"))
+            outfile.write((u"<td class=\"" + letterstyle + "\">" + self._escape(char[0]) + "</td>\n").encode("UTF-8"))
+            if atlas is not None:
+                outfile.write(self._atlas_cell(
+                    "outpic%d" % fonts[font][char]["img"],
+                    atlas["outpic%d" % fonts[font][char]["img"]], 1))
+            else:
+                outfile.write((u"<td><img%s alt=\"outpic%d\" src=\"pic/outpic" % (lazy, fonts[font][char]["img"])).encode("UTF-8"))
                 outfile.write((u"%d.jpg\"" % fonts[font][char]["img"])\
                         .encode("UTF-8"))
                 outfile.write((u" width=\"%d\" " % width).encode("UTF-8"))
                 outfile.write((u"height=\"%d\"/></td>\n" % height)\
                         .encode("UTF-8"))
-                outfile.write((u"<td class=\"" + letterstyle + "\">" + self._escape(char[0]) + "</td>\n").encode("UTF-8"))
-                outfile.write((u"<td class=\"cid\">CID: " \
-                        + char[1] + "</td>\n").encode("UTF-8"))
-                # line context
-                linebox = [float(x)
-                        for x in fonts[font][char]["linebox"].split(",")]
-                linewidth = int((linebox[2] - linebox[0])/72*self.resolution)/3
-                lineheight = int((linebox[3] - linebox[1])/72*self.resolution)/3
-                outfile.write((u"<td><img alt=\"linepic%d\" src=\"pic/linepic" % fonts[font][char]["img"]).encode("UTF-8"))
+            outfile.write((u"<td class=\"" + letterstyle + "\">" + self._escape(char[0]) + "</td>\n").encode("UTF-8"))
+            outfile.write((u"<td class=\"cid\">CID: " \
+                    + char[1] + "</td>\n").encode("UTF-8"))
+            # line context
+            linebox = [float(x)
+                    for x in fonts[font][char]["linebox"].split(",")]
+            linewidth = int((linebox[2] - linebox[0])/72*self.resolution)/3
+            lineheight = int((linebox[3] - linebox[1])/72*self.resolution)/3
+            if atlas is not None:
+                outfile.write(self._atlas_cell(
+                    "linepic%d" % fonts[font][char]["img"],
+                    atlas["linepic%d" % fonts[font][char]["img"]], 3))
+            else:
+                outfile.write((u"<td><img%s alt=\"linepic%d\" src=\"pic/linepic" % (lazy, fonts[font][char]["img"])).encode("UTF-8"))
                 outfile.write((u"%d.jpg\"" % fonts[font][char]["img"])\
                         .encode("UTF-8"))
                 outfile.write((u" width=\"%d\" " % linewidth).encode("UTF-8"))
                 outfile.write((u"height=\"%d\"/></td>\n" % lineheight)\
                         .encode("UTF-8"))
-                outfile.write((u"<td>Scan: %d</td>\n" %\
-                        fonts[font][char]["page"]).encode("UTF-8"))
-                # end line context
-                outfile.write((u"<td class=\"pic\">Pic: %d</td>\n" %\
-                        fonts[font][char]["img"]).encode("UTF-8"))
-                outfile.write(u"</tr>\n".encode("UTF-8"))
-                # add image to pages
-                pagenum = fonts[font][char]["page"]
-                pg = pages.get(pagenum, None)
-                if pg is None:
-                    pg = []
-                    pages[pagenum] = pg
-                pg.append((fonts[font][char]["img"], fonts[font][char]["bbox"],
-                    fonts[font][char]["linebox"]))
-            outfile.write((u"</table>\n").encode("UTF-8"))
-        # create images
-        outdir = os.path.join(self.fontdir, "pic")
-        if not os.path.isdir(outdir):
-            os.makedirs(outdir)
+            outfile.write((u"<td>Scan: %d</td>\n" %\
+                    fonts[font][char]["page"]).encode("UTF-8"))
+            # end line context
+            outfile.write((u"<td class=\"pic\">Pic: %d</td>\n" %\
+                    fonts[font][char]["img"]).encode("UTF-8"))
+            outfile.write(u"</tr>\n".encode("UTF-8"))
+        outfile.write((u"</table>\n").encode("UTF-8"))
+
+    def write_font_snippets(self, fonts, fontnames, outdir, ext="jpg"):
+        """Write the snippets of ``fonts`` (see :meth:`collect_fonts`)
+        to ``outdir``, page by page
+
+        With the snippet source ``render`` and ``make_images`` set, the
+        page images are rendered here and the snippets cropped from them
+        before they are released.
+        """
+        pages = {}
+        for font in fontnames:
+            for char in sorted(fonts[font]):
+                letter = fonts[font][char]
+                pages.setdefault(letter["page"], []).append(
+                    (letter["img"], letter["bbox"], letter["linebox"]))
+        if self.snippet_source == "render" and self.b_make_images:
+            # all pages in page order, cropping from the images in memory
+            writer = PageSnippetWriter(
+                    dict((p - 1, items) for p, items in pages.items()),
+                    outdir, ext)
+            for idx in self.images(on_image=writer):
+                pages.pop(idx + 1, None)
+            # left: pages whose images were up to date
+        renderer = PageRenderer(**self.render_settings())
+        manifest = RenderManifest(self.imdir)
+        jobs = []
         for p in list(pages.keys()):
-            basename = os.path.splitext(os.path.basename(self.pdffile))[0]
-            source_imgname = os.path.join(
-                self.imdir, "{}_{:05d}.jpg".format(basename, p)
-            )
-            img = Image.open(source_imgname)
-            for imnum, bbox, linebox in pages[p]:
-                imgfilename = os.path.join(outdir, "outpic%d.jpg" % imnum)
-                box = [float(x) for x in bbox.split(",")]
-                box = [x/float(72)*self.resolution for x in box]
-                tmp = img.size[1] - box[1]
-                box[1] = img.size[1] - box[3]
-                box[3] = tmp
-                box = [int(x) for x in box]
-                # Problem with some combining diacritical characters
-                # in Junicode font: they seem to have to vertical
-                # extension, thus x1 and x2 are the same. This leads
-                # to problems with the cropbox. Thus: if x- or y-values
-                # are the same, we extend the cropbox.
-                oldbox = None
-                if box[0] == box[2]:
-                    oldbox = [x for x in box]
-                    box[0] -= 5
-                    box[2] += 5
-                    if box[0] < 0:
-                        box[0] = 0
-                if box[1] == box[3]:
-                    if not oldbox:
-                        oldbox = [x for x in box]
-                    box[1] -= 5
-                    box[3] += 5
-                    if box[1] < 0:
-                        box[1] = 0
-                if oldbox:
-                    logging.info("Corrected cropbox %s --> %s",
-                        oldbox,
-                        box
-                    )
-                try:
-                    img2 = img.crop(box)
-                except (MemoryError,) as memerr:
-                    logging.error(
-                        ("%s: imagefilename: %s, box: %s, img: %s, "
-                         "bbox: %s, size: (%d, %d)"),
-                         memerr,
-                         imgfilename,
-                         box,
-                         source_imgname,
-                         bbox,
-                         img.size[0],
-                         img.size[1]
-                    )
-                    raise
-                try:
-                    img2.save(imgfilename)
-                except (SystemError,) as syserr:
-                    logging.error(
-                        ("%s: imagefilename: %s, box: %s, img: %s,"
-                         "bbox: %s, size: (%d, %d)"),
-                        syserr,
-                        imgfilename,
-                        box,
-                        source_imgname,
-                        bbox,
-                        img.size[0],
-                        img.size[1]
-                    )
-                    raise
-                del img2
-                imgfilename = os.path.join(outdir, "linepic%d.jpg" % imnum)
-                box2 = [float(x) for x in linebox.split(",")]
-                box2 = [x/float(72)*self.resolution for x in box2]
-                tmp = img.size[1] - box2[1]
-                box2[1] = img.size[1] - box2[3]
-                box2[3] = tmp
-                box2 = [int(x) for x in box2]
-                img2 = img.crop(box2)
-                draw = ImageDraw.Draw(img2)
-                draw.line([box[0]-box2[0], box[3]-box2[1],
-                    box[2]-box2[0], box[3]-box2[1]], fill=0x0000ff, width=14)
-                img2.save(imgfilename)
-                del img2
-        # tags = list(tags)
-        # tags.sort()
-        # print("")
-        # print("Tags (under textline):")
-        # for t in tags:
-        #     print("  " + t)
-        outfile.write(HTML_FOOT.encode("UTF-8"))
-        outfile.close()
+            if self.snippet_source == "pdf":
+                jobs.append((p - 1, None, self.snippet_resolution, pages[p]))
+            else:
+                name = renderer.image_name(p - 1)
+                # embedded scans have a resolution of their own
+                dpi = manifest.images.get(os.path.basename(name), {})\
+                        .get("dpi", (self.resolution, self.resolution))
+                jobs.append((p - 1, name, dpi, pages[p]))
+        write_page_snippets(
+                jobs, outdir,
+                pdffile=self.pdffile if self.snippet_source == "pdf"
+                        else None,
+                workers=self.workers,
+                ext=ext)
+
+    def write_atlases(self, fonts, fontnames, outdir):
+        """Write the snippets of every font to atlas sheets in
+        ``outdir``, ``font<n>_<sheet>.jpg`` (characters) and
+        ``font<n>_lines_<sheet>.jpg`` (line context), ``<n>`` being the
+        number of the font in the index (see
+        :func:`anapdf.snippets.pack_atlas`)
+
+        The snippets are written to a temporary directory first (as
+        PNG, thus compressed only once). Returns ``{snippet name:
+        (sheet file name, x, y, width, height, sheet width, sheet
+        height)}``.
+        """
+        tmpdir = tempfile.mkdtemp(dir=outdir)
+        ret = {}
+        try:
+            self.write_font_snippets(fonts, fontnames, tmpdir, ext="png")
+            for fontcount, font in enumerate(fontnames):
+                imgs = [fonts[font][char]["img"]
+                        for char in sorted(fonts[font])]
+                for prefix, atlasname in (
+                        ("outpic", "font%d_%%d.jpg" % fontcount),
+                        ("linepic", "font%d_lines_%%d.jpg" % fontcount)):
+                    names = ["%s%d" % (prefix, img) for img in imgs]
+                    boxes, sizes = pack_atlas(
+                            [os.path.join(tmpdir, name + ".png")
+                             for name in names],
+                            os.path.join(outdir, atlasname),
+                            quality=self.quality,
+                            optimize=self.b_optimize,
+                            progressive=self.b_progressive)
+                    for name, (sheet, x, y, w, h) in zip(names, boxes):
+                        ret[name] = ((atlasname % sheet, x, y, w, h) +
+                                     sizes[sheet])
+        finally:
+            shutil.rmtree(tmpdir)
+        return ret
+
+    def _atlas_cell(self, name, entry, scale):
+        """Table cell showing snippet ``name`` of an atlas sheet, reduced
+        by ``scale``
+        """
+        sheetname, x, y, width, height, sheet_width, sheet_height = entry
+        scale = float(scale)
+        return (u'<td><div title="%s" style="display:inline-block;'
+                u'width:%gpx;height:%gpx;background:url(pic/%s) '
+                u'-%gpx -%gpx/%gpx %gpx no-repeat"></div></td>\n' % (
+                    name, width/scale, height/scale, sheetname,
+                    x/scale, y/scale, sheet_width/scale,
+                    sheet_height/scale)).encode("UTF-8")
 
     def _escape(self, s):
         s = s.replace(u"&", u"&amp;")
@@ -409,57 +656,93 @@ class Analyzer(object):
         s = s.replace(u">", u"&gt;")
         return s
 
+    def extraction_journal(self, cache_key=None):
+        """The journal of the XML extraction (see
+        :class:`anapdf.journal.ExtractionJournal`) or ``None``
+
+        Font correctors only count for the key as the module they were
+        loaded from; without ``font_corrector_filename``, an extraction
+        with font correctors is not journaled, as it is not cached.
+        """
+        if not self.b_journal:
+            return None
+        if self.font_correctors and not self.font_corrector_filename:
+            logging.info("Font correctors of unknown origin, no journal")
+            return None
+        return ExtractionJournal(
+                self.xmlfile + ".journal",
+                cache_key or extraction_key(
+                    self.pdffile,
+                    laparams=self.laparams,
+                    corrector_file=self.font_corrector_filename,
+                    engine=self.engine),
+                discard=self.b_discard_journal)
+
     def get_xml_data(self):
         """Store XML representation of file"""
-        rm = PDFResourceManager(
-                caching=True, font_correctors=self.font_correctors)
-        laparams = LAParams()
-        outfp = open(self.xmlfile, "wb")
-        device = XMLConverter(rm, outfp, codec="UTF-8", laparams=laparams,
-                imagewriter=None)
-        interpreter = PDFPageInterpreter(rm, device)
-        infile = open(self.pdffile, "rb")
-        pagenos = set()
-        maxpages = 0
-        rotation = 0
-        password = ""
-        for page in PDFPage.get_pages(
-                infile,
-                pagenos,
-                maxpages=maxpages,
-                password=password,
-                caching=True,
-                check_extractable=True):
-            page.rotate = (page.rotate + rotation) % 360
-            interpreter.process_page(page)
-        self.font_metrics = {}
-        for font in list(rm._cached_fonts.values()):
-            try:
-                self.font_metrics[font.fontname] = {"bbox": font.bbox,
-                        "descent": font.descent}
-            except AttributeError:
-                print((dir(font)))
-        infile.close()
-        device.close()
-        outfp.close()
+        page_filter = None
         # adjust for differences between MediaBox and CropBox?
         if self.b_cropbox_correction:
-            doc = et.parse(self.xmlfile)
-            for page in doc.getroot():
-                if "cropbox" in page.attrib:
-                    mx0, my0, mx1, my1 = [
-                        float(x.strip())
-                        for x in page.get("bbox", "0,0,0,0").split(",")]
-                    cx0, cy0, cx1, cy1 = [
-                        float(x.strip())
-                        for x in page.get("cropboxraw").split(",")]
-                    xdiff = mx0 - cx0
-                    ydiff = my0 - cy0
-                    page.set("bbox", page.get("cropbox", ""))
-                    for e in page.iterdescendants():
-                        self.adjust_coords(e, xdiff, ydiff)
-            with open(self.xmlfile, "wb") as outfile:
-                outfile.write(et.tostring(doc, encoding="UTF-8"))
+            page_filter = self.correct_cropbox
+        cache, cache_key = None, None
+        if self.b_cache:
+            cache, cache_key = extraction_cache(
+                    self.pdffile,
+                    directory=self.cache_dir,
+                    max_size=self.cache_size,
+                    font_correctors=self.font_correctors,
+                    corrector_file=self.font_corrector_filename,
+                    laparams=self.laparams,
+                    engine=self.engine)
+        journal = self.extraction_journal(cache_key)
+        budget = None
+        if self.page_timeout or self.page_memory:
+            budget = PageBudget(self.page_timeout, self.page_memory,
+                                self.b_retry_pages)
+        with open(self.xmlfile, "wb") as outfp:
+            self.font_metrics = extract_xml(
+                    self.pdffile,
+                    outfp,
+                    font_correctors=self.font_correctors,
+                    laparams=self.laparams,
+                    workers=self.workers,
+                    page_filter=page_filter,
+                    cache=cache,
+                    cache_key=cache_key,
+                    engine=self.engine,
+                    budget=budget,
+                    journal=journal)
+        if budget is not None:
+            self.failed_pages = budget.failures
+            if budget.failures:
+                logging.warning(
+                    "Pages over budget: %s",
+                    ", ".join("{}{}".format(
+                        idx + 1, "" if recovered else " (empty)")
+                        for idx, status, recovered in sorted(budget.failures)))
+
+    def correct_cropbox(self, xml):
+        """Adjust the coordinates of a ``<page>`` element to its CropBox
+
+        ``xml`` is the serialized page as written by PDFMiner; pages
+        without a ``cropbox`` attribute are returned unchanged.
+        """
+        start, _, _ = xml.partition(b">")
+        if b' cropbox="' not in start:
+            return xml
+        page = et.fromstring(xml)
+        mx0, my0, mx1, my1 = [
+            float(x.strip())
+            for x in page.get("bbox", "0,0,0,0").split(",")]
+        cx0, cy0, cx1, cy1 = [
+            float(x.strip())
+            for x in page.get("cropboxraw").split(",")]
+        xdiff = mx0 - cx0
+        ydiff = my0 - cy0
+        page.set("bbox", page.get("cropbox", ""))
+        for e in page.iterdescendants():
+            self.adjust_coords(e, xdiff, ydiff)
+        return et.tostring(page, encoding="UTF-8") + b"\n"
 
     def adjust_coords(self, e, xdiff, ydiff):
         if "bbox" in e.attrib:
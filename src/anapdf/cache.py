@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Cache of extracted XML data
+
+The XML written by PDFMiner (before any cropbox correction) is stored
+gzip compressed together with the font metrics. An entry is addressed
+by the SHA-256 of the PDF file, the layout analysis parameters, the
+font corrector module and the version of anapdf; thus a changed file
+or setting never hits an old entry. The least recently used entries
+are deleted when the cache grows beyond its maximum size.
+"""
+
+import os
+import os.path
+import gzip
+import json
+import hashlib
+import logging
+import tempfile
+
+from . import __version__
+from .render import file_digest
+
+
+def default_directory():
+    """``$XDG_CACHE_HOME/anapdf``, or ``~/.cache/anapdf``"""
+    base = os.environ.get("XDG_CACHE_HOME") \
+            or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "anapdf")
+
+def extraction_key(pdffile, laparams=None, corrector_file=None,
+                   engine="pdfminer"):
+    """The key of the extraction of ``pdffile`` by ``engine`` with
+    ``laparams`` and the font correctors loaded from ``corrector_file``
+    """
+    if engine == "pymupdf":
+        # no layout analysis, the layout parameters do not matter
+        laparams = None
+    if laparams is not None:
+        laparams = [type(laparams).__name__,
+                    sorted(vars(laparams).items())]
+    corrector = None
+    if corrector_file:
+        corrector = file_digest(corrector_file)
+    settings = json.dumps({
+        "pdf": file_digest(pdffile),
+        "laparams": laparams,
+        "corrector": corrector,
+        "engine": engine,
+        "version": __version__,
+        }, sort_keys=True)
+    return hashlib.sha256(settings.encode("UTF-8")).hexdigest()
+
+
+class ExtractionCache(object):
+    """Content-addressed cache of extracted XML in ``directory``"""
+
+    directory = ""
+    max_size = 1024  # MB
+
+    def __init__(self, directory=None, max_size=None):
+        self.directory = directory or default_directory()
+        if max_size is not None:
+            self.max_size = max_size
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def key(self, pdffile, laparams=None, corrector_file=None,
+            engine="pdfminer"):
+        """The key of the extraction of ``pdffile``, see
+        :func:`extraction_key`
+        """
+        return extraction_key(pdffile, laparams, corrector_file, engine)
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + ".xml.gz", base + ".json"
+
+    def get(self, key):
+        """Return ``(fp, font_metrics)`` of entry ``key`` or ``None``
+
+        ``fp`` is the opened (decompressing) XML file.
+        """
+        xmlpath, metricspath = self._paths(key)
+        try:
+            with open(metricspath) as f:
+                font_metrics = json.load(f)
+            fp = gzip.open(xmlpath, "rb")
+        except (IOError, OSError, ValueError):
+            return None
+        for path in (xmlpath, metricspath):
+            os.utime(path, None)
+        for metrics in font_metrics.values():
+            metrics["bbox"] = tuple(metrics["bbox"])
+        logging.info("Extracted XML from cache: %s", xmlpath)
+        return fp, font_metrics
+
+    def create(self):
+        """Return a (compressing) file for the XML of a new entry"""
+        fd, tmpname = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        os.close(fd)
+        return gzip.open(tmpname, "wb")
+
+    def store(self, key, fp, font_metrics):
+        """Store the XML written to ``fp`` (from :meth:`create`) as the
+        entry ``key``
+        """
+        fp.close()
+        xmlpath, metricspath = self._paths(key)
+        tmpname = metricspath + ".tmp"
+        with open(tmpname, "w") as f:
+            json.dump(font_metrics, f)
+        os.replace(fp.name, xmlpath)
+        os.replace(tmpname, metricspath)
+        self.evict()
+
+    def discard(self, fp):
+        """Delete an entry file from :meth:`create` that is not stored"""
+        fp.close()
+        if os.path.isfile(fp.name):
+            os.remove(fp.name)
+
+    def evict(self):
+        """Delete least recently used entries beyond :attr:`max_size`"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".xml.gz"):
+                continue
+            xmlpath, metricspath = self._paths(name[:-len(".xml.gz")])
+            try:
+                size = os.path.getsize(xmlpath)
+                if os.path.isfile(metricspath):
+                    size += os.path.getsize(metricspath)
+                mtime = os.path.getmtime(xmlpath)
+            except OSError:
+                continue
+            entries.append((mtime, size, xmlpath, metricspath))
+            total += size
+        entries.sort()
+        while entries and total > self.max_size*2**20:
+            mtime, size, xmlpath, metricspath = entries.pop(0)
+            for path in (xmlpath, metricspath):
+                if os.path.isfile(path):
+                    os.remove(path)
+            total -= size
+            logging.info("Removed from cache: %s", xmlpath)
+
+
+def extraction_cache(pdffile, directory=None, max_size=None,
+                     font_correctors=None, corrector_file=None,
+                     laparams=None, engine="pdfminer"):
+    """Return the cache and the key for the extraction of ``pdffile``
+
+    Font correctors only count for the key as the module they were
+    loaded from; without ``corrector_file``, the XML of an extraction
+    with ``font_correctors`` is not cached, ``(None, None)`` is
+    returned.
+    """
+    if font_correctors and not corrector_file:
+        logging.info("Font correctors of unknown origin, not caching")
+        return None, None
+    cache = ExtractionCache(directory, max_size)
+    return cache, cache.key(pdffile, laparams, corrector_file, engine)
@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Compare the extraction engines (speed and fidelity)
+
+Both engines extract the same pages of a PDF file, each in a process
+of its own, so that time and memory belong to that engine alone. The
+XML of every page is then compared character by character:
+
+- characters of the first engine without a counterpart (same text,
+  box center within three times ``tolerance``) in the second are
+  *missing*, those of the second without a counterpart in the first
+  are *extra*
+- matched characters whose boxes deviate by more than ``tolerance``
+  points in any coordinate, or whose font names differ
+- textlines of one engine whose characters end up in more than one
+  textline of the other (e.g. a comma on a line of its own)
+- textlines with the same characters, but spaces in different places
+  (e.g. "R O B E R T" instead of "ROBERT")
+
+Only ``<text>`` elements with a font count as characters; the spaces
+without attributes that both engines insert count for the spacing.
+
+Usage: ``anapdf-compare PDFFILE [-p PAGES]``
+"""
+
+import os
+import sys
+import time
+import resource
+import multiprocessing
+
+from lxml import etree as et
+
+from .extraction import ENGINES
+
+
+def parse_pages(spec, page_count):
+    """0-based indexes of a page range like ``1-10,15`` (1-based)"""
+    if not spec:
+        return list(range(page_count))
+    indexes = []
+    for part in spec.split(","):
+        first, _, last = part.partition("-")
+        first = int(first)
+        last = int(last) if last else first
+        indexes.extend(range(first - 1, min(last, page_count)))
+    return indexes
+
+def _rss():
+    """Current resident set size in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages*os.sysconf("SC_PAGE_SIZE")/2.0**20
+    except (IOError, OSError, ValueError):
+        # peak instead of current
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.0
+
+def _run_engine(engine, pdffile, indexes, conn):
+    start = time.time()
+    extractor = ENGINES[engine](pdffile)
+    page_count = extractor.page_count
+    results = {"setup": time.time() - start, "pages": []}
+    for idx in indexes:
+        if idx >= page_count:
+            continue
+        start = time.time()
+        xml, metrics = extractor.extract(idx)
+        results["pages"].append((idx, time.time() - start, _rss(), xml))
+    extractor.close()
+    results["peak"] = \
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.0
+    conn.send(results)
+    conn.close()
+
+def run_engine(engine, pdffile, indexes):
+    """Extract ``indexes`` with ``engine`` in a new process
+
+    Returns a dict with the keys ``setup`` (seconds to open the file),
+    ``peak`` (peak RSS in MB) and ``pages``, a list of ``(idx, seconds,
+    rss, xml)``. Raises ``RuntimeError`` if the process dies before
+    sending them.
+    """
+    parent, child = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(
+            target=_run_engine, args=(engine, pdffile, indexes, child))
+    process.start()
+    child.close()
+    try:
+        results = parent.recv()
+    except EOFError:
+        # the process died (crash, out of memory, exception)
+        process.join()
+        raise RuntimeError("Extraction with {} failed (exit code {})"
+                           .format(engine, process.exitcode))
+    process.join()
+    return results
+
+
+class Char(object):
+    """A character of a page, with the index of its textline and
+    whether a space precedes it in this textline
+    """
+
+    __slots__ = ("text", "font", "bbox", "line", "space")
+
+    def __init__(self, text, font, bbox, line, space=False):
+        self.text = text
+        self.font = font
+        self.bbox = bbox
+        self.line = line
+        self.space = space
+
+    @property
+    def center(self):
+        return ((self.bbox[0] + self.bbox[2])/2.0,
+                (self.bbox[1] + self.bbox[3])/2.0)
+
+
+def page_chars(xml):
+    """Characters and lines of the XML of a ``<page>``
+
+    Returns ``(chars, lines)``; ``lines`` are the texts of the
+    textlines, with spaces. Characters outside textlines have the line
+    ``None``. Coordinates are shifted to the CropBox if the page has a
+    ``cropbox`` attribute, as :meth:`anapdf.Analyzer.correct_cropbox`
+    does.
+    """
+    page = et.fromstring(xml)
+    xdiff = ydiff = 0.0
+    if "cropbox" in page.attrib:
+        mx0, my0 = [float(v) for v in page.get("bbox").split(",")[:2]]
+        cx0, cy0 = [float(v) for v in page.get("cropboxraw").split(",")[:2]]
+        xdiff, ydiff = mx0 - cx0, my0 - cy0
+    chars = []
+    lines = []
+    for text in page.iter("text"):
+        parent = text.getparent()
+        line = None
+        space = False
+        if parent.tag == "textline":
+            if parent.get("_n") is None:
+                parent.set("_n", str(len(lines)))
+                lines.append(u"")
+            line = int(parent.get("_n"))
+            space = lines[line].endswith(u" ")
+            lines[line] += (text.text or u"").replace(u"\n", u"")
+        if text.get("font") is None or not (text.text or u"").strip():
+            continue
+        x0, y0, x1, y1 = [float(v) for v in text.get("bbox").split(",")]
+        bbox = (x0 + xdiff, y0 + ydiff, x1 + xdiff, y1 + ydiff)
+        chars.append(Char(text.text, text.get("font"), bbox, line, space))
+    return chars, lines
+
+def match_chars(chars_a, chars_b, tolerance):
+    """Pair the characters of both engines
+
+    Every character of ``chars_a`` is paired with the nearest unpaired
+    character of ``chars_b`` with the same text and a box center within
+    ``tolerance``. Returns ``(pairs, missing, extra)``.
+    """
+    candidates = {}
+    for char in chars_b:
+        candidates.setdefault(char.text, []).append(char)
+    pairs = []
+    missing = []
+    for char in chars_a:
+        x, y = char.center
+        best = None
+        best_distance = None
+        for other in candidates.get(char.text, ()):
+            ox, oy = other.center
+            distance = max(abs(x - ox), abs(y - oy))
+            if distance <= tolerance and (
+                    best is None or distance < best_distance):
+                best, best_distance = other, distance
+        if best is None:
+            missing.append(char)
+        else:
+            candidates[char.text].remove(best)
+            pairs.append((char, best))
+    extra = [c for chars in candidates.values() for c in chars]
+    return pairs, missing, extra
+
+def split_lines(pairs, first=0):
+    """Lines of engine ``first`` (0 or 1) spread over several lines of
+    the other engine, ``{line: set of lines}``
+    """
+    targets = {}
+    for pair in pairs:
+        line, other = pair[first].line, pair[1 - first].line
+        if line is not None and other is not None:
+            targets.setdefault(line, set()).add(other)
+    return {line: others for line, others in targets.items()
+            if len(others) > 1}
+
+def spacing_differences(pairs, lines_a, lines_b):
+    """Texts of the lines whose matched characters are preceded by a
+    space in one engine only, ``[(line of a, line of b)]``
+    """
+    ret = []
+    seen = set()
+    for a, b in pairs:
+        if a.line is None or b.line is None or a.space == b.space:
+            continue
+        if (a.line, b.line) not in seen:
+            seen.add((a.line, b.line))
+            ret.append((lines_a[a.line].strip(), lines_b[b.line].strip()))
+    return ret
+
+def compare_page(xml_a, xml_b, tolerance=1.0):
+    """Structural differences of the XML of one page by two engines"""
+    chars_a, lines_a = page_chars(xml_a)
+    chars_b, lines_b = page_chars(xml_b)
+    pairs, missing, extra = match_chars(chars_a, chars_b, 3*tolerance)
+    deviations = [
+        max(abs(u - v) for u, v in zip(a.bbox, b.bbox))
+        for a, b in pairs]
+    fonts = set((a.font, b.font) for a, b in pairs if a.font != b.font)
+    return {
+        "chars": (len(chars_a), len(chars_b)),
+        "lines": (len(lines_a), len(lines_b)),
+        "missing": [c.text for c in missing],
+        "extra": [c.text for c in extra],
+        "bbox": len([d for d in deviations if d > tolerance]),
+        "max_deviation": max(deviations) if deviations else 0.0,
+        "font_mismatches": len([1 for a, b in pairs if a.font != b.font]),
+        "fonts": sorted(fonts),
+        "split_a": split_lines(pairs, 0),
+        "split_b": split_lines(pairs, 1),
+        "spacing": spacing_differences(pairs, lines_a, lines_b),
+    }
+
+def compare(pdffile, indexes=None, engines=("pdfminer", "pymupdf"),
+            tolerance=1.0):
+    """Run both ``engines`` on the pages ``indexes`` of ``pdffile``
+
+    Returns ``(results, diffs)``: the results of :func:`run_engine` per
+    engine and ``[(idx, diff)]`` with the diffs of
+    :func:`compare_page`.
+    """
+    if indexes is None:
+        extractor = ENGINES[engines[0]](pdffile)
+        indexes = range(extractor.page_count)
+        extractor.close()
+    indexes = list(indexes)
+    results = [run_engine(engine, pdffile, indexes) for engine in engines]
+    diffs = []
+    for page_a, page_b in zip(results[0]["pages"], results[1]["pages"]):
+        diffs.append((page_a[0],
+                      compare_page(page_a[3], page_b[3], tolerance)))
+    return results, diffs
+
+def report(results, diffs, engines=("pdfminer", "pymupdf"), examples=3,
+           out=None):
+    """Write a plain text report of :func:`compare` to ``out``"""
+    if out is None:
+        out = sys.stdout
+    a, b = engines
+    out.write(u"{:>6} {:>10} {:>10} {:>9} {:>9} {:>7} {:>7} {:>7} "
+              u"{:>7} {:>7} {:>7} {:>7}\n".format(
+                  "page", a[:10] + " s", b[:10] + " s", "RSS a", "RSS b",
+                  "chars", "miss", "extra", "bbox", "font", "split",
+                  "space"))
+    totals = dict.fromkeys(
+            ("chars", "missing", "extra", "bbox", "font", "split",
+             "spacing"), 0)
+    for (idx, diff), page_a, page_b in zip(
+            diffs, results[0]["pages"], results[1]["pages"]):
+        split = len(diff["split_a"]) + len(diff["split_b"])
+        out.write(u"{:>6} {:>10.3f} {:>10.3f} {:>9.1f} {:>9.1f} {:>7} "
+                  u"{:>7} {:>7} {:>7} {:>7} {:>7} {:>7}\n".format(
+                      idx + 1, page_a[1], page_b[1], page_a[2],
+                      page_b[2], diff["chars"][0], len(diff["missing"]),
+                      len(diff["extra"]), diff["bbox"],
+                      diff["font_mismatches"], split,
+                      len(diff["spacing"])))
+        totals["chars"] += diff["chars"][0]
+        totals["missing"] += len(diff["missing"])
+        totals["extra"] += len(diff["extra"])
+        totals["bbox"] += diff["bbox"]
+        totals["font"] += diff["font_mismatches"]
+        totals["split"] += split
+        totals["spacing"] += len(diff["spacing"])
+    out.write(u"\n")
+    for engine, result in zip(engines, results):
+        pages = result["pages"]
+        elapsed = sum(p[1] for p in pages)
+        out.write(u"{}: setup {:.2f} s, {} pages in {:.2f} s "
+                  u"({:.3f} s/page), peak RSS {:.1f} MB\n".format(
+                      engine, result["setup"], len(pages), elapsed,
+                      elapsed/max(len(pages), 1), result["peak"]))
+    out.write(u"characters ({}): {chars}, missing in {}: {missing}, "
+              u"extra in {}: {extra}, bbox deviations: {bbox}, "
+              u"font mismatches: {font}, split lines: {split}, "
+              u"spacing differences: {spacing}\n".format(
+                  a, b, b, **totals))
+    if examples:
+        for idx, diff in diffs:
+            lines = []
+            if diff["missing"]:
+                lines.append(u"  missing: {}".format(
+                    u"".join(diff["missing"][:examples*10])))
+            if diff["extra"]:
+                lines.append(u"  extra: {}".format(
+                    u"".join(diff["extra"][:examples*10])))
+            for font_a, font_b in diff["fonts"][:examples]:
+                lines.append(u"  font: {} / {}".format(font_a, font_b))
+            for text_a, text_b in diff["spacing"][:examples]:
+                lines.append(u"  spacing: {!r} / {!r}".format(
+                    text_a, text_b))
+            if lines:
+                out.write(u"page {}:\n{}\n".format(
+                    idx + 1, u"\n".join(lines)))
@@ -12,13 +12,13 @@ import io
 from lxml import etree as et
 from lxml.builder import ElementMaker
 import xmlhelper
-from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
-from pdfminer.converter import XMLConverter
-from pdfminer.layout import LAParams
-from pdfminer.pdfpage import PDFPage
 from simplestyle import styles
+from pdfminer.layout import LAParams
 
 from . import fontenc
+from .extraction import extract_xml, make_laparams, ENGINES, LAYOUTS
+from .extraction import PageBudget
+from .cache import extraction_cache
 
 ns = xmlhelper.ns
 tei = ns["tei"]
@@ -58,6 +58,13 @@ class TEIConverter(Converter):
     linecounter = 0  # current line on page
     wordcount = 0  # current word in line
     font_correctors = None  # list of font correctors
+    font_corrector_filename = None  # module the correctors are from
+    b_cache = True  # use the extraction cache for PDF files
+    cache_dir = None
+    cache_size = None
+    engine = "pdfminer"  # XML extraction: "pdfminer" or "pymupdf"
+    laparams = None  # LAParams of the extraction
+    budget = None  # PageBudget of the extraction
     default_font_size = None  # a base font size to be assumed
     g_list = None  # a list of all glyph elements, they need
                    # some preprocessing
@@ -78,9 +85,38 @@ class TEIConverter(Converter):
             "org/dsdl/schematron\"?>"
 
     def __init__(self, sourcefile, fontencfile=None, font_correctors=None,
-                 default_font_size=None, replace_soft_hyphen=True):
+                 default_font_size=None, replace_soft_hyphen=True,
+                 font_corrector_filename=None, cache=True, cache_dir=None,
+                 cache_size=None, engine="pdfminer", layout="full",
+                 laparams=None, page_timeout=None, page_memory=None,
+                 retry_pages=True):
         if not os.path.isfile(sourcefile):
             raise ConverterError("File not found: {}".format(str(sourcefile)))
+        # the correctors are needed for the extraction of PDF files
+        self.font_correctors = []
+        if font_correctors is not None:
+            for fc in font_correctors:
+                self.font_correctors.append(fc)
+        self.font_corrector_filename = font_corrector_filename
+        self.b_cache = cache
+        self.cache_dir = cache_dir
+        self.cache_size = cache_size
+        if engine not in ENGINES:
+            raise ConverterError("Unknown engine: {}".format(engine))
+        if self.font_correctors and engine != "pdfminer":
+            raise ConverterError("Font correctors need the pdfminer engine.")
+        self.engine = engine
+        if layout not in LAYOUTS:
+            raise ConverterError("Unknown layout: {}".format(layout))
+        if not isinstance(laparams, LAParams):
+            try:
+                laparams = make_laparams(layout, **(laparams or {}))
+            except (TypeError, ValueError) as e:
+                raise ConverterError(
+                    "Invalid layout parameters: {}".format(e))
+        self.laparams = laparams
+        if page_timeout or page_memory:
+            self.budget = PageBudget(page_timeout, page_memory, retry_pages)
         if sourcefile.endswith(".xml"):
             self.g_list = []
             context = et.iterparse(sourcefile, tag=["g", "pages"])
@@ -104,10 +140,6 @@ class TEIConverter(Converter):
                 raise ConverterError("Font re-encoding file {} not found."\
                         .format(str(fontencfile)))
             self.repltable = fontenc.read(fontencfile)
-        self.font_correctors = []
-        if font_correctors is not None:
-            for fc in font_correctors:
-                self.font_correctors.append(fc)
         self.styles = {}
         self.default_font_size = default_font_size
         self.replace_soft_hyphen = replace_soft_hyphen
@@ -144,6 +176,9 @@ class TEIConverter(Converter):
         Args:
             stop_after(int): stop after n pages, leave empty to process all
         """
+        # the font metrics are no text
+        for fonts in self.doc.xpath("/pages/fonts"):
+            xmlhelper.delete(fonts)
         # @@@Experimental: preflight for special characters
         # (<g>)
         self._handle_glyphs()
@@ -746,28 +781,20 @@ class TEIConverter(Converter):
 
     def _get_xml_data(self, sourcefile):
         """Store XML representation fo file"""
-        rm = PDFResourceManager(
-                caching=True, font_correctors=self.font_correctors)
-        laparams = LAParams()
+        cache, cache_key = None, None
+        if self.b_cache:
+            cache, cache_key = extraction_cache(
+                    sourcefile,
+                    directory=self.cache_dir,
+                    max_size=self.cache_size,
+                    font_correctors=self.font_correctors,
+                    corrector_file=self.font_corrector_filename,
+                    laparams=self.laparams,
+                    engine=self.engine)
         outfp = io.BytesIO()
-        device = XMLConverter(rm, outfp, codec="UTF-8", laparams=laparams,
-                imagewriter=None)
-        interpreter = PDFPageInterpreter(rm, device)
-        infile = open(sourcefile, "rb")
-        pagenos = set()
-        maxpages = 0
-        rotation = 0
-        password = ""
-        for page in PDFPage.get_pages(
-                infile,
-                pagenos,
-                maxpages=maxpages,
-                password=password,
-                caching=True,
-                check_extractable=True):
-            interpreter.process_page(page)
-        infile.close()
-        device.close()
+        extract_xml(sourcefile, outfp, font_correctors=self.font_correctors,
+                laparams=self.laparams, cache=cache, cache_key=cache_key,
+                engine=self.engine, budget=self.budget)
         retval = outfp.getvalue()
         outfp.close()
         return retval
@@ -0,0 +1,601 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Extract XML data from PDF files with PDFMiner (or PyMuPDF, see
+:mod:`anapdf.mupdf`)
+"""
+
+import io
+import time
+import logging
+import resource
+import functools
+import collections
+import multiprocessing
+import multiprocessing.connection
+
+from lxml import etree as et
+from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+from pdfminer.converter import XMLConverter
+from pdfminer.layout import LAParams
+from pdfminer.pdfpage import PDFPage
+
+from .mupdf import MuPDFPageExtractor, empty_page
+from .layout import GridLAParams, LinesLAParams, GridXMLConverter
+from .workers import map_jobs
+
+
+#: layout analysis modes, keyword arguments of ``LAParams``
+LAYOUTS = {
+    # lines, text boxes and their hierarchical grouping (the default)
+    "full": {},
+    # lines and text boxes in the order of their position, without the
+    # expensive grouping of the boxes (see anapdf.layout.sort_page)
+    "lines": {"boxes_flow": None},
+    # lines and text boxes by anapdf's grid analysis in reading order
+    # (see anapdf.layout), fast on dense pages
+    "grid": {"boxes_flow": None},
+}
+
+def make_laparams(layout="full", **params):
+    """``LAParams`` for ``layout`` (see :data:`LAYOUTS`), overridden by
+    all ``params`` that are not ``None``
+    """
+    kwargs = dict(LAYOUTS[layout])
+    kwargs.update((k, v) for k, v in params.items() if v is not None)
+    if layout == "grid":
+        return GridLAParams(**kwargs)
+    if layout == "lines":
+        return LinesLAParams(**kwargs)
+    return LAParams(**kwargs)
+
+
+class PageExtractor(object):
+    """Extract the XML of single pages of a PDF file
+
+    Each extractor has its own ``PDFResourceManager`` and
+    ``XMLConverter``, thus every worker process needs an extractor of
+    its own. The ``<page>`` elements are returned one by one; the head
+    and foot of the XML document are in :attr:`head` and returned by
+    :meth:`close`.
+    """
+
+    pdffile = ""
+    font_correctors = None
+
+    def __init__(self, pdffile, font_correctors=None, laparams=None):
+        self.pdffile = pdffile
+        self.font_correctors = font_correctors or []
+        if laparams is None:
+            laparams = LAParams()
+        self.rm = PDFResourceManager(
+                caching=True, font_correctors=self.font_correctors)
+        self.outfp = io.BytesIO()
+        converter = GridXMLConverter \
+                if isinstance(laparams, (GridLAParams, LinesLAParams)) \
+                else XMLConverter
+        self.device = converter(self.rm, self.outfp, codec="UTF-8",
+                laparams=laparams, imagewriter=None)
+        self.head = self._take()
+        self.interpreter = PDFPageInterpreter(self.rm, self.device)
+        self.infile = None
+        self.pages = None
+        self.reported_fonts = set()
+
+    def _take(self):
+        """Return and discard the output written so far"""
+        data = self.outfp.getvalue()
+        self.outfp.seek(0)
+        self.outfp.truncate()
+        return data
+
+    def open(self):
+        """Open the PDF file and read its page list (only once)"""
+        if self.pages is None:
+            self.infile = open(self.pdffile, "rb")
+            self.pages = list(PDFPage.get_pages(
+                self.infile,
+                set(),
+                maxpages=0,
+                password="",
+                caching=True,
+                check_extractable=True))
+        return self.pages
+
+    @property
+    def page_count(self):
+        return len(self.open())
+
+    def extract(self, idx):
+        """Extract page ``idx`` (0-based)
+
+        Returns the XML of the ``<page>`` element and the metrics of
+        the fonts that have been loaded for this page (and not been
+        returned for any previous page).
+        """
+        page = self.open()[idx]
+        # the page id is the page number, even if we skip pages
+        self.device.pageno = idx + 1
+        self.interpreter.process_page(page)
+        return self._take(), self.font_metrics()
+
+    def font_metrics(self):
+        """Metrics of the fonts loaded since the last call"""
+        ret = {}
+        for font in list(self.rm._cached_fonts.values()):
+            if id(font) in self.reported_fonts:
+                continue
+            self.reported_fonts.add(id(font))
+            try:
+                ret[font.fontname] = {"bbox": font.bbox,
+                        "descent": font.descent,
+                        "ascent": font.ascent,
+                        "italic_angle": font.italic_angle,
+                        "flags": font.flags}
+            except AttributeError:
+                logging.warning("No metrics for font %r", font)
+        return ret
+
+    def close(self):
+        """Close the PDF file, return the foot of the XML document"""
+        self.device.close()
+        if self.infile is not None:
+            self.infile.close()
+            self.infile = None
+        return self._take()
+
+
+#: font metrics and their attributes in the ``<fonts>`` section
+FONT_METRICS = (
+    ("bbox", "bbox"),
+    ("descent", "descent"),
+    ("ascent", "ascent"),
+    ("italic_angle", "italicangle"),
+    ("flags", "flags"),
+)
+
+def _attr(value):
+    value = u"%s" % (value,)
+    for c, entity in ((u"&", u"&amp;"), (u"<", u"&lt;"), (u'"', u"&quot;")):
+        value = value.replace(c, entity)
+    return value
+
+def fonts_xml(font_metrics):
+    """The ``<fonts>`` section with ``font_metrics``, written after the
+    pages
+    """
+    out = [u"<fonts>\n"]
+    for name in sorted(font_metrics):
+        metrics = font_metrics[name]
+        out.append(u'<font name="%s"' % _attr(name))
+        for key, attr in FONT_METRICS:
+            if key not in metrics:
+                continue
+            value = metrics[key]
+            if key == "bbox":
+                value = u",".join(u"%s" % (v,) for v in value)
+            out.append(u' %s="%s"' % (attr, _attr(value)))
+        out.append(u" />\n")
+    out.append(u"</fonts>\n")
+    return u"".join(out).encode("UTF-8")
+
+def _number(s):
+    try:
+        return int(s)
+    except ValueError:
+        return float(s)
+
+def parse_font_metrics(fonts):
+    """Font metrics from the ``<fonts>`` element ``fonts``
+
+    The section is written after the pages; XML written by an older
+    version of anapdf or by PDFMiner itself has none.
+    """
+    ret = {}
+    for font in fonts.iter("font"):
+        metrics = {}
+        for key, attr in FONT_METRICS:
+            value = font.get(attr)
+            if value is None:
+                continue
+            if key == "bbox":
+                metrics[key] = tuple(_number(v) for v in value.split(","))
+            else:
+                metrics[key] = _number(value)
+        ret[font.get("name")] = metrics
+    return ret
+
+
+#: extractor classes of the engines
+ENGINES = {
+    "pdfminer": PageExtractor,
+    "pymupdf": MuPDFPageExtractor,
+}
+
+def _extract_page(extractor, idx):
+    return (idx,) + extractor.extract(idx)
+
+def extract_pages(pdffile, indexes=None, font_correctors=None,
+                  laparams=None, workers=1, engine="pdfminer", budget=None):
+    """Extract the pages ``indexes`` (0-based, all if ``None``)
+
+    With ``workers`` > 1 the pages are distributed in shards to as many
+    processes, each with its own resource manager and a copy of the
+    ``font_correctors`` (which have to be picklable). The results
+    ``(idx, xml, font_metrics)`` are yielded in the order of
+    ``indexes``.
+
+    With a ``budget`` (:class:`PageBudget`), the pages are extracted by
+    :func:`supervised_pages`.
+    """
+    if indexes is None:
+        extractor = ENGINES[engine](pdffile, font_correctors, laparams)
+        indexes = range(extractor.page_count)
+        extractor.close()
+    indexes = list(indexes)
+    if budget is not None:
+        for result in supervised_pages(pdffile, indexes, font_correctors,
+                                       laparams, workers, engine, budget):
+            yield result
+        return
+    extractor = functools.partial(ENGINES[engine], pdffile,
+                                  font_correctors, laparams)
+    shard = len(indexes)//(min(workers or 1, len(indexes) or 1)*4)
+    for result in map_jobs(_extract_page, indexes, extractor, workers,
+                           chunksize=max(1, shard)):
+        yield result
+
+
+class PageBudget(object):
+    """Time and memory limits for the extraction of a single page
+
+    ``timeout`` is in seconds, ``memory`` in MB (the address space a
+    worker process may allocate after opening the PDF file, enforced
+    by ``RLIMIT_AS``); ``None`` means no limit. Pages
+    over budget are extracted once more with the cheaper ``grid``
+    layout (PDFMiner engine only) if ``retry`` is true, otherwise, or
+    if that fails too, they are written as an empty ``<page>`` with a
+    ``status`` attribute (``timeout``, ``memory``, ``error`` or
+    ``crash``). Retried pages have the attribute ``retried`` with the
+    status of the first attempt.
+
+    Pages over budget are recorded in :attr:`failures` as ``(idx,
+    status, recovered)``. A page that neither ends nor runs out of
+    memory is only stopped by ``timeout``.
+    """
+
+    timeout = None
+    memory = None
+    retry = True
+
+    def __init__(self, timeout=None, memory=None, retry=True):
+        self.timeout = timeout
+        self.memory = memory
+        self.retry = retry
+        self.failures = []
+
+    def cheap_laparams(self, laparams):
+        """The layout parameters of the retry of a page"""
+        kwargs = vars(laparams) if laparams is not None else {}
+        return GridLAParams(**dict(
+            (k, v) for k, v in kwargs.items() if k != "boxes_flow"))
+
+
+def _address_space():
+    """Size of the address space of this process in bytes (0 if
+    unknown)
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0])*resource.getpagesize()
+    except (IOError, OSError, ValueError):
+        return 0
+
+def _supervised_worker(engine, pdffile, font_correctors, laparams,
+                       cheap_laparams, memory, conn):
+    """Extract the pages requested through ``conn`` until ``None``
+
+    Requests are ``(idx, cheap)``, answers ``(idx, status, xml,
+    font_metrics)`` with the status ``None`` for success. The worker
+    ends after a page that ran out of memory or raised.
+    """
+    try:
+        extractors = {False: ENGINES[engine](
+            pdffile, font_correctors, laparams)}
+        extractors[False].open()
+    except Exception as e:
+        conn.send(e)
+        return
+    if memory:
+        soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+        limit = _address_space() + memory*2**20
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    conn.send(None)
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        idx, cheap = request
+        status = None
+        try:
+            if cheap not in extractors:
+                extractors[cheap] = ENGINES[engine](
+                        pdffile, font_correctors, cheap_laparams)
+            xml, metrics = extractors[cheap].extract(idx)
+        except MemoryError:
+            status = "memory"
+        except Exception as e:
+            logging.warning("Page %d: %r", idx + 1, e)
+            status = "error"
+        if status is not None:
+            # free the layout of the page before answering
+            extractors.clear()
+            conn.send((idx, status, None, None))
+            break
+        conn.send((idx, None, xml, metrics))
+    conn.close()
+
+
+def _mark_retried(xml, status):
+    """The XML of a ``<page>`` with the attribute ``retried``"""
+    page = et.fromstring(xml)
+    page.set("retried", status)
+    return et.tostring(page, encoding="UTF-8") + b"\n"
+
+
+class _Supervised(object):
+    """A worker process of :func:`supervised_pages`"""
+
+    def __init__(self, args):
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+                target=_supervised_worker, args=args + (child,))
+        self.process.start()
+        child.close()
+        self.ready = False
+        self.request = None
+        self.deadline = None
+
+    def send(self, request, timeout):
+        self.conn.send(request)
+        self.request = request
+        self.deadline = time.time() + timeout if timeout else None
+
+    def stop(self):
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+
+def supervised_pages(pdffile, indexes, font_correctors=None, laparams=None,
+                     workers=1, engine="pdfminer", budget=None):
+    """Extract the pages ``indexes`` within ``budget``
+    (:class:`PageBudget`), see :func:`extract_pages`
+
+    Every page is handed to one of ``workers`` worker processes on its
+    own; a worker whose page exceeds the time limit, runs out of memory,
+    raises or dies is replaced by a new one.
+    """
+    if budget is None:
+        budget = PageBudget()
+    retry = budget.retry and engine == "pdfminer" \
+            and not isinstance(laparams, GridLAParams)
+    args = (engine, pdffile, font_correctors, laparams,
+            budget.cheap_laparams(laparams) if retry else None,
+            budget.memory)
+    tasks = collections.deque((idx, False) for idx in indexes)
+    results = {}
+    first_status = {}
+    pool = [_Supervised(args)
+            for _ in range(max(1, min(workers or 1, len(indexes))))]
+
+    def failed(request, status):
+        idx, cheap = request
+        if not cheap and retry:
+            logging.warning("Page %d: %s, retrying with layout grid",
+                            idx + 1, status)
+            first_status[idx] = status
+            tasks.appendleft((idx, True))
+            return
+        logging.warning("Page %d: %s, writing an empty page",
+                        idx + 1, status)
+        budget.failures.append((idx, first_status.pop(idx, status), False))
+        results[idx] = (empty_page(pdffile, idx, status), {})
+
+    def replace(worker):
+        worker.stop()
+        pool[pool.index(worker)] = _Supervised(args)
+
+    try:
+        for idx in indexes:
+            while idx not in results:
+                for worker in pool:
+                    if worker.ready and worker.request is None and tasks:
+                        worker.send(tasks.popleft(), budget.timeout)
+                deadlines = [w.deadline for w in pool
+                             if w.deadline is not None]
+                timeout = max(0, min(deadlines) - time.time()) \
+                        if deadlines else None
+                conns = multiprocessing.connection.wait(
+                        [w.conn for w in pool], timeout)
+                for worker in list(pool):
+                    if worker.conn in conns:
+                        try:
+                            message = worker.conn.recv()
+                        except EOFError:
+                            if not worker.ready:
+                                raise RuntimeError(
+                                    "Extraction worker died on startup")
+                            if worker.request is not None:
+                                failed(worker.request, "crash")
+                            replace(worker)
+                            continue
+                        if isinstance(message, BaseException):
+                            raise message
+                        if message is None:
+                            worker.ready = True
+                            continue
+                        page, status, xml, metrics = message
+                        request = worker.request
+                        worker.request = worker.deadline = None
+                        if status is not None:
+                            failed(request, status)
+                            replace(worker)
+                        elif page in first_status:
+                            status = first_status.pop(page)
+                            budget.failures.append((page, status, True))
+                            results[page] = (
+                                    _mark_retried(xml, status), metrics)
+                        else:
+                            results[page] = (xml, metrics)
+                    elif worker.deadline is not None \
+                            and worker.deadline <= time.time():
+                        failed(worker.request, "timeout")
+                        replace(worker)
+            xml, metrics = results.pop(idx)
+            yield idx, xml, metrics
+    finally:
+        for worker in pool:
+            if worker.process.is_alive():
+                try:
+                    worker.conn.send(None)
+                except (IOError, OSError):
+                    pass
+            worker.stop()
+
+def journaled_pages(journal, pdffile, indexes, font_correctors=None,
+                    laparams=None, workers=1, engine="pdfminer",
+                    budget=None):
+    """Extract the pages ``indexes`` missing in ``journal``
+    (:class:`anapdf.journal.ExtractionJournal`) into it, then yield all
+    pages as :func:`extract_pages` does
+
+    Pages written empty because they were over ``budget`` are not
+    journaled, a rerun tries them again.
+    """
+    indexes = list(indexes)
+    missing = [idx for idx in indexes if idx not in journal]
+    if len(missing) < len(indexes):
+        logging.info("Resuming extraction, %d of %d pages in journal",
+                     len(indexes) - len(missing), len(indexes))
+    empty = {}
+    for idx, xml, metrics in extract_pages(
+            pdffile, missing, font_correctors=font_correctors,
+            laparams=laparams, workers=workers, engine=engine,
+            budget=budget):
+        if budget is not None and any(
+                i == idx and not recovered
+                for i, status, recovered in budget.failures):
+            empty[idx] = (xml, metrics)
+        else:
+            journal.add(idx, xml, metrics)
+    for idx in indexes:
+        if idx in empty:
+            xml, metrics = empty.pop(idx)
+        else:
+            xml, metrics = journal.get(idx)
+        yield idx, xml, metrics
+
+def split_pages(fp):
+    """Yield the head, every ``<page>`` element, the ``<fonts>`` section
+    and the foot of the XML document in ``fp`` (as written by
+    :func:`extract_xml`)
+    """
+    chunk = []
+    for line in fp:
+        if line.startswith(b"<page ") or line.startswith(b"<fonts>") \
+                or line.startswith(b"</pages>"):
+            yield b"".join(chunk)
+            chunk = []
+        chunk.append(line)
+    yield b"".join(chunk)
+
+def extract_xml(pdffile, outfp, font_correctors=None, laparams=None,
+                workers=1, page_filter=None, cache=None, cache_key=None,
+                engine="pdfminer", budget=None, journal=None):
+    """Write the PDFMiner XML of all pages of ``pdffile`` to ``outfp``
+
+    ``page_filter`` is called with the XML of every ``<page>`` element
+    and returns the XML to be written instead, thus only one page at a
+    time needs to be held in memory.
+
+    If a ``cache`` (:class:`anapdf.cache.ExtractionCache`) is given,
+    the XML is read from its entry ``cache_key`` if there is one, and
+    stored there (without ``page_filter`` applied) otherwise.
+
+    ``engine`` is one of :data:`ENGINES`. With a ``budget``
+    (:class:`PageBudget`), pages over budget are retried or written
+    empty; an extraction with such pages is not cached.
+
+    With a ``journal`` (:class:`anapdf.journal.ExtractionJournal`), the
+    pages are extracted into the journal first (see
+    :func:`journaled_pages`), thus an interrupted extraction resumes
+    with the missing pages; the journal is deleted when the XML is
+    complete.
+
+    The metrics of all fonts are written to a ``<fonts>`` section
+    after the pages (see :func:`parse_font_metrics`) and returned,
+    ``{fontname: {"bbox": ..., "descent": ..., ...}}``.
+    """
+    if cache is not None:
+        entry = cache.get(cache_key)
+        if entry is not None:
+            fp, font_metrics = entry
+            with fp:
+                for xml in split_pages(fp):
+                    if page_filter is not None \
+                            and xml.startswith(b"<page "):
+                        xml = page_filter(xml)
+                    outfp.write(xml)
+            if journal is not None:
+                journal.discard()
+            return font_metrics
+        rawfp = cache.create()
+    else:
+        rawfp = None
+    # head and foot of the document, as the XMLConverter writes them
+    frame = ENGINES[engine](pdffile, font_correctors, laparams)
+    font_metrics = {}
+    failures = len(budget.failures) if budget is not None else 0
+    try:
+        if rawfp is not None:
+            rawfp.write(frame.head)
+        outfp.write(frame.head)
+        if journal is None:
+            pages = extract_pages(
+                    pdffile, font_correctors=font_correctors,
+                    laparams=laparams, workers=workers, engine=engine,
+                    budget=budget)
+        else:
+            pages = journaled_pages(
+                    journal, pdffile, range(frame.page_count),
+                    font_correctors=font_correctors, laparams=laparams,
+                    workers=workers, engine=engine, budget=budget)
+        for idx, xml, metrics in pages:
+            if rawfp is not None:
+                rawfp.write(xml)
+            if page_filter is not None:
+                xml = page_filter(xml)
+            outfp.write(xml)
+            font_metrics.update(metrics)
+        xml = fonts_xml(font_metrics) + frame.close()
+        if rawfp is not None:
+            rawfp.write(xml)
+        outfp.write(xml)
+    except BaseException:
+        frame.close()
+        if rawfp is not None:
+            cache.discard(rawfp)
+        raise
+    if rawfp is not None:
+        if budget is not None and len(budget.failures) > failures:
+            cache.discard(rawfp)
+        else:
+            cache.store(cache_key, rawfp, font_metrics)
+    if journal is not None:
+        journal.discard()
+    return font_metrics
@@ -5,6 +5,7 @@
 Help with font re-encoding.
 """
 
+import os.path
 from io import open
 
 from lxml import etree as et
@@ -12,6 +13,9 @@ from lxml import etree as et
 def read(filename):
     """
     Read replacement table from filename.
+
+    A table of contents linking to one page per font (see
+    ``--split-index``) is followed to these pages.
     """
     ret = {}  # {fontname: {"repl": {
               #             (foundchar, cid):
@@ -20,6 +24,10 @@ def read(filename):
               #         }
               #     }
     doc = et.HTML(open(filename, "br").read())
+    directory = os.path.dirname(filename)
+    for href in doc.xpath("//a/@href"):
+        if not href.startswith("#") and href.endswith(".htm"):
+            ret.update(read(os.path.join(directory, href)))
     for font in doc.xpath("//h1"):
         fontname = font.text
         ret[fontname] = {}
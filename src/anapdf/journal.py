@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Journal of the pages of an interrupted XML extraction
+
+Every extracted ``<page>`` (as written by the engine, before any
+cropbox correction) is stored in a directory of its own together with
+the metrics of the fonts first seen on it. A rerun of the same
+extraction (same key, see :func:`anapdf.cache.extraction_key`) only
+extracts the pages that are missing; a journal of another extraction
+is discarded. The journal is deleted once the XML file is complete.
+"""
+
+import os
+import os.path
+import json
+import shutil
+import logging
+
+
+class ExtractionJournal(object):
+    """Journal of the extraction ``key`` in ``directory`` (emptied
+    first if ``discard`` is true)
+    """
+
+    directory = ""
+    key = None
+
+    def __init__(self, directory, key, discard=False):
+        self.directory = directory
+        self.key = key
+        keyfile = os.path.join(directory, "key")
+        if discard:
+            self.discard()
+        if os.path.isdir(directory):
+            try:
+                with open(keyfile) as f:
+                    stored = f.read().strip()
+            except (IOError, OSError):
+                stored = None
+            if stored != key:
+                logging.info("Discarding journal of another extraction: %s",
+                             directory)
+                self.discard()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+            with open(keyfile, "w") as f:
+                f.write(key)
+
+    def _paths(self, idx):
+        base = os.path.join(self.directory, "%05d" % (idx + 1))
+        return base + ".xml", base + ".json"
+
+    def __contains__(self, idx):
+        return os.path.isfile(self._paths(idx)[1])
+
+    def add(self, idx, xml, font_metrics):
+        """Store the XML and font metrics of page ``idx``"""
+        xmlpath, metricspath = self._paths(idx)
+        with open(xmlpath + ".tmp", "wb") as f:
+            f.write(xml)
+        os.replace(xmlpath + ".tmp", xmlpath)
+        # the metrics file marks the page as complete
+        with open(metricspath + ".tmp", "w") as f:
+            json.dump(font_metrics, f)
+        os.replace(metricspath + ".tmp", metricspath)
+
+    def get(self, idx):
+        """Return ``(xml, font_metrics)`` of page ``idx``"""
+        xmlpath, metricspath = self._paths(idx)
+        with open(metricspath) as f:
+            font_metrics = json.load(f)
+        for metrics in font_metrics.values():
+            metrics["bbox"] = tuple(metrics["bbox"])
+        with open(xmlpath, "rb") as f:
+            return f.read(), font_metrics
+
+    def discard(self):
+        """Delete the journal"""
+        if os.path.isdir(self.directory):
+            shutil.rmtree(self.directory)
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Layout analysis of PDFMiner pages in near-linear time
+
+PDFMiner groups the text boxes of a page hierarchically
+(``LAParams.boxes_flow``); this costs more than linearly with the
+number of boxes and takes minutes on dense pages like indexes and
+registers. :func:`group_page` replaces the whole analysis:
+
+- characters are grouped into lines as by PDFMiner (consecutive
+  characters on the same line, ``char_margin``, ``word_margin``)
+- lines are grouped into text boxes by the same neighborhood rule as
+  PDFMiner's (same height and left, right or center aligned within
+  ``line_margin``), but neighbors are looked up in a grid of cells
+  about one line high instead of PDFMiner's ``Plane``
+- the boxes are ordered by recursive XY cuts: horizontal bands first,
+  then columns within a band
+
+The result is the same ``LTTextBox``/``LTTextLine`` structure PDFMiner
+writes, with the box index in reading order.
+
+:func:`sort_page` keeps PDFMiner's lines and text boxes, but orders the
+boxes by their position instead of grouping them hierarchically (what
+``boxes_flow=None`` does in recent versions of pdfminer.six only).
+"""
+
+import math
+
+from pdfminer.converter import XMLConverter
+from pdfminer.layout import LAParams, LTChar, LTFigure, \
+        LTTextLineHorizontal, LTTextBoxHorizontal, LTTextBoxVertical
+
+
+class GridLAParams(LAParams):
+    """``LAParams`` selecting :func:`group_page` (``boxes_flow`` is not
+    used)
+    """
+
+
+class LinesLAParams(LAParams):
+    """``LAParams`` selecting :func:`sort_page` (``boxes_flow`` is not
+    used)
+    """
+
+
+def _is_neighbor(line, other, d):
+    """PDFMiner's rule for ``other`` being in the same box as ``line``
+    (``d`` is ``line_margin`` times the height of ``line``)
+    """
+    if isinstance(line, LTTextLineHorizontal):
+        return (abs(other.height - line.height) <= d
+                and (abs(other.x0 - line.x0) <= d
+                     or abs(other.x1 - line.x1) <= d
+                     or abs(other.x0 + other.x1 - line.x0 - line.x1) <= 2*d))
+    return (abs(other.width - line.width) <= d
+            and (abs(other.y0 - line.y0) <= d
+                 or abs(other.y1 - line.y1) <= d
+                 or abs(other.y0 + other.y1 - line.y0 - line.y1) <= 2*d))
+
+def _search_box(line, ratio):
+    """The area of PDFMiner's neighbor search around ``line``"""
+    if isinstance(line, LTTextLineHorizontal):
+        d = ratio*line.height
+        return d, (line.x0, line.y0 - d, line.x1, line.y1 + d)
+    d = ratio*line.width
+    return d, (line.x0 - d, line.y0, line.x1 + d, line.y1)
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values)//2]
+
+def group_lines(lines, line_margin):
+    """Group ``lines`` (all horizontal or all vertical) into boxes
+
+    Returns lists of lines in the order of their first line.
+    """
+    if not lines:
+        return []
+    # cells of about one line by one line length
+    cw = max(_median([line.width for line in lines]), 1.0)
+    ch = max(_median([line.height for line in lines]), 1.0)
+    grid = {}
+    for i, line in enumerate(lines):
+        for cell in _cells(line.bbox, cw, ch):
+            grid.setdefault(cell, []).append(i)
+    parent = list(range(len(lines)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, line in enumerate(lines):
+        d, (x0, y0, x1, y1) = _search_box(line, line_margin)
+        seen = set()
+        for cell in _cells((x0, y0, x1, y1), cw, ch):
+            for j in grid.get(cell, ()):
+                if j in seen:
+                    continue
+                seen.add(j)
+                other = lines[j]
+                # overlapping as in Plane.find
+                if (other.x1 <= x0 or x1 <= other.x0
+                        or other.y1 <= y0 or y1 <= other.y0):
+                    continue
+                if _is_neighbor(line, other, d):
+                    root_i, root_j = find(i), find(j)
+                    if root_i != root_j:
+                        parent[max(root_i, root_j)] = min(root_i, root_j)
+    groups = {}
+    for i in range(len(lines)):
+        groups.setdefault(find(i), []).append(lines[i])
+    return [groups[root] for root in sorted(groups)]
+
+def _cells(bbox, cw, ch):
+    x0, y0, x1, y1 = bbox
+    for ix in range(int(math.floor(x0/cw)), int(math.floor(x1/cw)) + 1):
+        for iy in range(int(math.floor(y0/ch)), int(math.floor(y1/ch)) + 1):
+            yield ix, iy
+
+def _split(boxes, lower, upper):
+    """Split ``boxes`` at the gaps between the intervals ``[lower(box),
+    upper(box)]``, in ascending order
+    """
+    boxes = sorted(boxes, key=lower)
+    groups = []
+    end = None
+    for box in boxes:
+        if end is None or lower(box) >= end:
+            groups.append([box])
+            end = upper(box)
+        else:
+            groups[-1].append(box)
+            end = max(end, upper(box))
+    return groups
+
+def reading_order(boxes):
+    """Order ``boxes`` by recursive XY cuts
+
+    Boxes separated by a horizontal gap come top to bottom, boxes of a
+    band separated by a vertical gap (columns) left to right; boxes
+    that cannot be separated are sorted by their top, then left edge.
+    """
+    ret = []
+    stack = [boxes]
+    while stack:
+        boxes = stack.pop()
+        if len(boxes) <= 1:
+            ret.extend(boxes)
+            continue
+        groups = _split(boxes, lambda box: -box.y1, lambda box: -box.y0)
+        if len(groups) == 1:
+            groups = _split(boxes, lambda box: box.x0, lambda box: box.x1)
+            if len(groups) == 1:
+                ret.extend(sorted(boxes, key=lambda box: (-box.y1, box.x0)))
+                continue
+        stack.extend(reversed(groups))
+    return ret
+
+def _split_page(ltpage, laparams):
+    """The text lines, other objects and empty lines of ``ltpage``
+    (``None`` if there is no text)
+    """
+    textobjs = []
+    otherobjs = []
+    for obj in ltpage:
+        if isinstance(obj, LTChar):
+            textobjs.append(obj)
+        else:
+            otherobjs.append(obj)
+    for obj in otherobjs:
+        if isinstance(obj, LTFigure) and laparams.all_texts:
+            # text in figures: PDFMiner's own analysis
+            obj.analyze(laparams)
+    if not textobjs:
+        return None
+    textlines = []
+    empties = []
+    for line in ltpage.group_objects(laparams, textobjs):
+        (empties if line.is_empty() else textlines).append(line)
+    for line in empties:
+        line.analyze(laparams)
+    return textlines, otherobjs, empties
+
+def group_page(ltpage, laparams):
+    """Analyze the layout of ``ltpage`` (instead of
+    ``LTPage.analyze``)
+    """
+    objs = _split_page(ltpage, laparams)
+    if objs is None:
+        return
+    textlines, otherobjs, empties = objs
+    horizontal = []
+    vertical = []
+    for line in textlines:
+        (horizontal if isinstance(line, LTTextLineHorizontal)
+         else vertical).append(line)
+    textboxes = []
+    for lines, cls in ((vertical, LTTextBoxVertical),
+                       (horizontal, LTTextBoxHorizontal)):
+        boxes = []
+        for group in group_lines(lines, laparams.line_margin):
+            box = cls()
+            for line in group:
+                box.add(line)
+            box.analyze(laparams)
+            boxes.append(box)
+        if cls is LTTextBoxVertical:
+            # right to left, as PDFMiner without boxes_flow
+            boxes.sort(key=lambda box: (-box.x1, -box.y0))
+        else:
+            boxes = reading_order(boxes)
+        textboxes.extend(boxes)
+    for idx, box in enumerate(textboxes):
+        box.index = idx
+    ltpage._objs = textboxes + otherobjs + empties
+
+def sort_page(ltpage, laparams):
+    """Analyze the layout of ``ltpage`` as PDFMiner does, but order the
+    text boxes by their position: vertical boxes right to left, then
+    horizontal boxes top to bottom, left to right
+    """
+    objs = _split_page(ltpage, laparams)
+    if objs is None:
+        return
+    textlines, otherobjs, empties = objs
+    textboxes = list(ltpage.group_textlines(laparams, textlines))
+    for box in textboxes:
+        box.analyze(laparams)
+
+    def key(box):
+        if isinstance(box, LTTextBoxVertical):
+            return (0, -box.x1, -box.y0)
+        return (1, -box.y0, box.x0)
+
+    textboxes.sort(key=key)
+    for idx, box in enumerate(textboxes):
+        box.index = idx
+    ltpage._objs = textboxes + otherobjs + empties
+
+
+class GridXMLConverter(XMLConverter):
+    """``XMLConverter`` analyzing the layout with :func:`group_page`,
+    or :func:`sort_page` for :class:`LinesLAParams`
+    """
+
+    def __init__(self, rsrcmgr, outfp, laparams=None, **kwargs):
+        XMLConverter.__init__(self, rsrcmgr, outfp, laparams=None, **kwargs)
+        self.grid_laparams = laparams or GridLAParams()
+
+    def receive_layout(self, ltpage):
+        if isinstance(self.grid_laparams, LinesLAParams):
+            sort_page(ltpage, self.grid_laparams)
+        else:
+            group_page(ltpage, self.grid_laparams)
+        XMLConverter.receive_layout(self, ltpage)
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Extract XML data in the format of PDFMiner with PyMuPDF
+
+The ``<page>/<textbox>/<textline>/<text>`` structure is taken from the
+blocks, lines and characters of ``Page.get_text("rawdict")``; glyph ids
+and character boxes come from ``Page.get_texttrace()``. The glyph id is
+written as ``cid``; the boxes of the trace are, as PDFMiner's, one font
+size high, starting at the font's descent.
+
+As in PDFMiner's XML, coordinates are those of the page as displayed
+(rotated), y upwards; the origin is the lower left corner of the
+CropBox, i.e. what PDFMiner's XML looks like after the cropbox
+correction. The pages have no ``cropbox`` attribute.
+Figures, curves and the layout tree are not written, neither are glyph
+names.
+"""
+
+import re
+import logging
+
+import fitz
+from pdfminer.fontmetrics import FONT_METRICS
+
+HEAD = b'<?xml version="1.0" encoding="UTF-8" ?>\n<pages>\n'
+FOOT = b'</pages>\n'
+
+_escapes = {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;"}
+_escape_re = re.compile(r'[&<>"]')
+
+def _enc(s):
+    return _escape_re.sub(lambda m: _escapes[m.group(0)], s)
+
+def _bbox(rect, m=None):
+    """``rect`` transformed by matrix ``m`` (a multiple of 90 degrees)
+    as PDFMiner's bbox attribute
+
+    PyMuPDF's ``Rect`` and ``Point`` arithmetic is slow for thousands of
+    characters, thus the matrix is applied here.
+    """
+    x0, y0, x1, y1 = rect
+    if m is not None:
+        a, b, c, d, e, f = m
+        x0, y0, x1, y1 = (a*x0 + c*y0 + e, b*x0 + d*y0 + f,
+                          a*x1 + c*y1 + e, b*x1 + d*y1 + f)
+    return "%.3f,%.3f,%.3f,%.3f" % (
+        min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+
+def _number(s):
+    """A PDF number as int or float"""
+    value = float(s)
+    if value.is_integer() and "." not in s:
+        return int(value)
+    return value
+
+# PyMuPDF's setting for subset font names before the first open extractor
+# set it (see MuPDFPageExtractor.open), and the number of open extractors
+_subset_fontnames = None
+_open_extractors = 0
+
+def _keep_subset_prefixes():
+    """Write font names with their subset prefixes ("ABCDEF+Junicode"),
+    as PDFMiner does: the font index and the font correctors tell
+    subsets apart by them. The setting is global to PyMuPDF, thus it is
+    only changed while extractors are open, see :func:`_restore`.
+    """
+    global _subset_fontnames, _open_extractors
+    if _open_extractors == 0:
+        _subset_fontnames = bool(fitz.TOOLS.set_subset_fontnames())
+        fitz.TOOLS.set_subset_fontnames(True)
+    _open_extractors += 1
+
+def _restore():
+    """Restore PyMuPDF's setting once the last extractor is closed"""
+    global _open_extractors
+    _open_extractors -= 1
+    if _open_extractors == 0:
+        fitz.TOOLS.set_subset_fontnames(_subset_fontnames)
+
+def empty_page(pdffile, idx, status):
+    """An empty ``<page>`` element for page ``idx`` of ``pdffile``
+    with the attribute ``status`` (for a page that could not be
+    extracted)
+    """
+    pdf = fitz.open(pdffile)
+    try:
+        page = pdf[idx]
+        xml = u'<page id="%d" bbox="%s" rotate="%d" status="%s">\n' \
+              u'</page>\n' % (
+                  idx + 1, _bbox((0, 0, page.rect.width, page.rect.height)),
+                  page.rotation, _enc(status))
+    finally:
+        pdf.close()
+    return xml.encode("UTF-8")
+
+
+class MuPDFPageExtractor(object):
+    """Extract the XML of single pages of a PDF file with PyMuPDF
+
+    Same interface as :class:`anapdf.extraction.PageExtractor`.
+    """
+
+    pdffile = ""
+    head = HEAD
+
+    def __init__(self, pdffile, font_correctors=None, laparams=None):
+        if font_correctors:
+            raise ValueError("Font correctors need the pdfminer engine")
+        self.pdffile = pdffile
+        self.pdf = None
+        self.reported_fonts = set()
+
+    def open(self):
+        if self.pdf is None:
+            _keep_subset_prefixes()
+            try:
+                self.pdf = fitz.open(self.pdffile)
+            except Exception:
+                _restore()
+                raise
+        return self.pdf
+
+    @property
+    def page_count(self):
+        return self.open().page_count
+
+    def extract(self, idx):
+        """Extract page ``idx`` (0-based), see
+        :meth:`anapdf.extraction.PageExtractor.extract`
+        """
+        page = self.open()[idx]
+        # PyMuPDF's text coordinates: unrotated page, origin top left of
+        # the CropBox, y down
+        width, height = page.rect.width, page.rect.height
+        matrix = tuple(page.rotation_matrix
+                       * fitz.Matrix(1, 0, 0, -1, 0, height))
+        glyphs = {}
+        for span in page.get_texttrace():
+            for ucs, gid, origin, bbox in span["chars"]:
+                glyphs[(round(origin[0], 2), round(origin[1], 2))] = \
+                        (gid, bbox)
+        out = [u'<page id="%d" bbox="%s" rotate="%d"' % (
+            idx + 1,
+            _bbox((0, 0, width, height)),
+            page.rotation)]
+        label = page.get_label()
+        if label:
+            out.append(u' label="%s"' % _enc(label))
+        out.append(u'>\n')
+        textbox = 0
+        for block in page.get_text("rawdict")["blocks"]:
+            if block["type"] != 0:
+                continue
+            out.append(u'<textbox id="%d" bbox="%s">\n' % (
+                textbox, _bbox(block["bbox"], matrix)))
+            textbox += 1
+            for line in block["lines"]:
+                out.append(u'<textline bbox="%s">\n'
+                           % _bbox(line["bbox"], matrix))
+                for span in line["spans"]:
+                    self.text(out, span, glyphs, matrix)
+                out.append(u'<text>\n</text>\n</textline>\n')
+            out.append(u'</textbox>\n')
+        out.append(u'</page>\n')
+        return u"".join(out).encode("UTF-8"), self.font_metrics(page)
+
+    def text(self, out, span, glyphs, matrix):
+        """Append the ``<text>`` elements of the characters of ``span``"""
+        font = _enc(span["font"])
+        size = span["size"]
+        a, b, c, d, e, f = matrix
+        for char in span["chars"]:
+            ch = char["c"]
+            x, y = char["origin"]
+            glyph = glyphs.get((round(x, 2), round(y, 2)))
+            if glyph is None and ch == u" ":
+                # a space inserted by MuPDF, as PDFMiner's LTAnno
+                out.append(u'<text> </text>\n')
+                continue
+            if glyph is None:
+                bbox, cid = char["bbox"], u""
+            else:
+                bbox, cid = glyph[1], u' cid="%d"' % glyph[0]
+            out.append(
+                u'<text font="%s" bbox="%s" origin="%.3f,%.3f"%s '
+                u'size="%.3f">%s</text>\n' % (
+                    font, _bbox(bbox, matrix),
+                    a*x + c*y + e, b*x + d*y + f, cid, size, _enc(ch)))
+
+    def font_metrics(self, page):
+        """Metrics of the fonts of ``page`` not reported before
+
+        ``bbox`` and ``descent`` are read from the font descriptor (of
+        the descendant font), as PDFMiner does; standard fonts without
+        one get PDFMiner's metrics, other fonts those of the font
+        PyMuPDF substitutes.
+        """
+        ret = {}
+        for xref, ext, ftype, name, refname, encoding, *_ in \
+                page.get_fonts(full=True):
+            if name in self.reported_fonts:
+                continue
+            self.reported_fonts.add(name)
+            try:
+                ret[name] = self._descriptor_metrics(xref) \
+                        or self._font_metrics(name)
+            except (RuntimeError, ValueError):
+                logging.warning("No metrics for font %r", name)
+        return ret
+
+    def _descriptor_metrics(self, xref):
+        pdf = self.pdf
+        kind, value = pdf.xref_get_key(xref, "DescendantFonts")
+        if kind == "array":
+            xref = int(value.strip("[]").split()[0])
+        kind, value = pdf.xref_get_key(xref, "FontDescriptor")
+        if kind != "xref":
+            return None
+        descriptor = int(value.split()[0])
+        kind, bbox = pdf.xref_get_key(descriptor, "FontBBox")
+        kind, descent = pdf.xref_get_key(descriptor, "Descent")
+        if bbox == "null" or descent == "null":
+            return None
+        metrics = {
+            "bbox": tuple(_number(v) for v in bbox.strip("[]").split()),
+            "descent": -abs(_number(descent))}
+        # defaults as in PDFMiner
+        for key, name in (("ascent", "Ascent"),
+                          ("italic_angle", "ItalicAngle"),
+                          ("flags", "Flags")):
+            kind, value = pdf.xref_get_key(descriptor, name)
+            metrics[key] = _number(value) if kind in ("int", "float") else 0
+        return metrics
+
+    def _font_metrics(self, name):
+        name = name.split("+")[-1]
+        if name in FONT_METRICS:
+            # a standard font: PDFMiner's AFM metrics
+            metrics = FONT_METRICS[name][0]
+            return {"bbox": metrics["FontBBox"],
+                    "descent": metrics["Descent"],
+                    "ascent": metrics["Ascent"],
+                    "italic_angle": metrics["ItalicAngle"],
+                    "flags": metrics["Flags"]}
+        font = fitz.Font(fontname=name)
+        bbox = fitz.Rect(font.bbox.x0, font.bbox.y0,
+                         font.bbox.x1, font.bbox.y1)
+        return {"bbox": tuple(round(v*1000) for v in bbox),
+                "descent": round(font.descender*1000),
+                "ascent": round(font.ascender*1000),
+                "italic_angle": 0,
+                "flags": 0}
+
+    def close(self):
+        if self.pdf is not None:
+            self.pdf.close()
+            self.pdf = None
+            _restore()
+        return FOOT
@@ -0,0 +1,683 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Render PDF pages to image files
+"""
+
+import os
+import os.path
+import io
+import json
+import zlib
+import struct
+import hashlib
+import logging
+import functools
+import contextlib
+
+import fitz
+from PIL import Image
+
+from .tiles import PYRAMIDS, write_dzi, write_iiif, write_thumbnail
+from .workers import map_jobs
+
+
+def pixmap_to_image(pix):
+    """Wrap the samples of a ``fitz.Pixmap`` in a PIL image
+
+    The samples are passed to PIL as a memoryview, thus there is no
+    intermediate ``bytes`` copy. Where PIL can use the buffer as is
+    (grayscale), the image shares the memory of the pixmap, so the
+    pixmap has to outlive the image.
+    """
+    mode = {1: "L", 3: "RGB"}[pix.n]
+    return Image.frombuffer(
+            mode, (pix.w, pix.h), pix.samples_mv, "raw", mode, pix.stride, 1)
+
+
+# supported page image formats and their file extensions
+IMAGE_FORMATS = {
+    "jpeg": "jpg",
+    "png": "png",
+    "webp": "webp",
+    "tiff": "tif",
+}
+
+# colormodes of page images; "auto" chooses between "rgb" and "gray"
+COLORMODES = ("rgb", "gray", "bitonal", "auto")
+
+def has_color(im, saturation=32, fraction=1e-5):
+    """Does the RGB image ``im`` contain colored pixels?
+
+    A pixel counts as colored if its saturation exceeds ``saturation``
+    (0-255); the image counts as colored if more than ``fraction`` of
+    its pixels are colored (but at least one).
+    """
+    # half the size is precise enough and four times faster
+    if im.size[0] > 1 and im.size[1] > 1:
+        im = im.reduce(2)
+    hist = im.convert("HSV").getchannel("S").histogram()
+    colored = sum(hist[saturation + 1:])
+    return colored > max(0, int(im.size[0] * im.size[1] * fraction))
+
+def to_bitonal(im, threshold=128):
+    """Convert ``im`` to black and white without dithering"""
+    if im.mode != "L":
+        im = im.convert("L")
+    return im.point(lambda v: 255 if v >= threshold else 0, "1")
+
+class PNGWriter(object):
+    """Write a PNG file incrementally, a band of rows at a time
+
+    Supports the PIL modes ``1``, ``L`` and ``RGB``; the rows are
+    expected as returned by ``Image.tobytes()``.
+    """
+
+    chunk_size = 1 << 16
+
+    def __init__(self, fp, size, mode, dpi=None, compress_level=6):
+        self.fp = fp
+        self.width, self.height = size
+        self.mode = mode
+        bitdepth, colortype, self.rowbytes = {
+            "1": (1, 0, (self.width + 7)//8),
+            "L": (8, 0, self.width),
+            "RGB": (8, 2, self.width*3),
+        }[mode]
+        self.compressor = zlib.compressobj(
+                6 if compress_level is None else compress_level)
+        self.pending = []
+        self.pending_size = 0
+        self.fp.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(
+                ">IIBBBBB", self.width, self.height, bitdepth, colortype,
+                0, 0, 0))
+        if dpi is not None:
+            self._chunk(b"pHYs", struct.pack(
+                    ">IIB", int(round(dpi[0]/0.0254)),
+                    int(round(dpi[1]/0.0254)), 1))
+
+    def _chunk(self, tag, data):
+        self.fp.write(struct.pack(">I", len(data)))
+        self.fp.write(tag)
+        self.fp.write(data)
+        self.fp.write(struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff))
+
+    def _idat(self, data):
+        self.pending.append(data)
+        self.pending_size += len(data)
+        if self.pending_size >= self.chunk_size:
+            self._chunk(b"IDAT", b"".join(self.pending))
+            self.pending = []
+            self.pending_size = 0
+
+    def write(self, data):
+        """Append complete rows (without PNG filter bytes)"""
+        for pos in range(0, len(data), self.rowbytes):
+            self._idat(self.compressor.compress(
+                    b"\x00" + data[pos:pos + self.rowbytes]))
+
+    def close(self):
+        self._idat(self.compressor.flush())
+        if self.pending:
+            self._chunk(b"IDAT", b"".join(self.pending))
+        self._chunk(b"IEND", b"")
+
+
+def page_image_name(basename, pageno, ext="jpg"):
+    """Filename of the image of (1-based) page ``pageno``"""
+    return "{}_{:05d}.{}".format(basename, pageno, ext)
+
+
+def file_digest(filename):
+    """SHA-256 hex digest of the content of ``filename``"""
+    h = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+@contextlib.contextmanager
+def replacing(filename):
+    """Binary file object for ``filename``, written to a temporary file
+    that replaces ``filename`` only once it is complete
+    """
+    tmpname = filename + ".tmp"
+    try:
+        with open(tmpname, "wb") as f:
+            yield f
+    except BaseException:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        raise
+    os.replace(tmpname, filename)
+
+
+class RenderManifest(object):
+    """Record of the page images in an image directory
+
+    For every image file, the manifest stores the content hash of the
+    PDF file, the page index and the render settings. An image whose
+    entry matches the current settings (and whose file is still there
+    with the recorded size) need not be rendered again.
+    """
+
+    filename = "manifest.json"
+    # recorded results of rendering, not settings
+    result_keys = ("bytes", "colorspace", "source", "dpi")
+
+    def __init__(self, imdir):
+        self.imdir = imdir
+        self.filename = os.path.join(imdir, RenderManifest.filename)
+        self.images = {}
+        if os.path.isfile(self.filename):
+            try:
+                with open(self.filename, "r") as f:
+                    self.images = json.load(f)
+            except ValueError:
+                logging.warning("Ignoring broken manifest %s", self.filename)
+
+    def is_current(self, name, entry):
+        """Is image ``name`` up to date with respect to ``entry``?"""
+        stored = self.images.get(name)
+        if stored is None:
+            return False
+        stored = dict(stored)
+        size = stored.get("bytes")
+        for key in self.result_keys:
+            stored.pop(key, None)
+        if stored != entry:
+            return False
+        path = os.path.join(self.imdir, name)
+        return os.path.isfile(path) and os.path.getsize(path) == size
+
+    def update(self, name, entry, info=None):
+        """Record image ``name`` as rendered with ``entry``, ``info`` is
+        the information returned by :meth:`PageRenderer.render`."""
+        entry = dict(entry)
+        if info is not None:
+            entry.update(info)
+        entry["bytes"] = os.path.getsize(os.path.join(self.imdir, name))
+        self.images[name] = entry
+
+    def save(self):
+        tmpname = self.filename + ".tmp"
+        with open(tmpname, "w") as f:
+            json.dump(self.images, f, indent=1, sort_keys=True)
+        os.replace(tmpname, self.filename)
+
+
+class PageRenderer(object):
+    """Render single pages of a PDF file into an image directory
+
+    Each renderer holds its own ``fitz.Document``, thus every worker
+    process needs a renderer of its own.
+    """
+
+    pdffile = ""
+    imdir = ""
+    resolution = 300
+    image_format = "jpeg"
+    quality = 85  # JPEG and WebP
+    compress_level = None  # PNG: zlib level 0-9, WebP: method 0-6
+    optimize = False  # JPEG and PNG
+    progressive = False  # JPEG
+    colormode = "rgb"  # see COLORMODES
+    embedded = False  # write embedded full-page scans instead of rendering
+    memory_limit = None  # MB, render larger pages in bands
+    pyramid = None  # tile pyramid, see tiles.PYRAMIDS
+    tile_size = 256
+    thumbnail_size = None  # max. width/height of thumbnails
+    iiif_base_url = ""
+
+    def __init__(self, pdffile, imdir, resolution=300, image_format="jpeg",
+                 quality=85, compress_level=None, optimize=False,
+                 progressive=False, colormode="rgb", embedded=False,
+                 memory_limit=None, pyramid=None, tile_size=256,
+                 thumbnail_size=None, iiif_base_url=""):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError("Unknown image format: {}".format(image_format))
+        if colormode not in COLORMODES:
+            raise ValueError("Unknown colormode: {}".format(colormode))
+        if pyramid is not None and pyramid not in PYRAMIDS:
+            raise ValueError("Unknown pyramid: {}".format(pyramid))
+        if memory_limit and image_format != "png":
+            # the other formats are encoded from the whole page image
+            raise ValueError("A memory limit needs PNG page images, "
+                             "not {}".format(image_format))
+        self.pdffile = pdffile
+        self.imdir = imdir
+        self.resolution = resolution
+        self.image_format = image_format
+        self.quality = quality
+        self.compress_level = compress_level
+        self.optimize = optimize
+        self.progressive = progressive
+        self.colormode = colormode
+        self.embedded = embedded
+        self.memory_limit = memory_limit
+        self.pyramid = pyramid
+        self.tile_size = tile_size
+        self.thumbnail_size = thumbnail_size
+        self.iiif_base_url = iiif_base_url
+        self.basename = os.path.splitext(os.path.basename(pdffile))[0]
+        self.pdf = None
+
+    def open(self):
+        """Open the PDF file (only once)"""
+        if self.pdf is None:
+            self.pdf = fitz.open(self.pdffile)
+        return self.pdf
+
+    def close(self):
+        if self.pdf is not None:
+            self.pdf.close()
+            self.pdf = None
+
+    def image_name(self, idx):
+        """Full path of the image for page ``idx`` (0-based)"""
+        return os.path.join(
+            self.imdir, page_image_name(
+                self.basename, idx + 1, IMAGE_FORMATS[self.image_format]))
+
+    def save_options(self, im):
+        """Keyword arguments for saving ``im`` with PIL"""
+        fmt = self.image_format
+        options = {"format": fmt.upper()}
+        if fmt != "webp":
+            options["dpi"] = (self.resolution, self.resolution)
+        if fmt in ("jpeg", "webp"):
+            options["quality"] = self.quality
+        if fmt in ("jpeg", "png"):
+            options["optimize"] = self.optimize
+        if fmt == "jpeg":
+            options["progressive"] = self.progressive
+        if self.compress_level is not None:
+            if fmt == "png":
+                options["compress_level"] = self.compress_level
+            elif fmt == "webp":
+                options["method"] = self.compress_level
+        if fmt == "tiff":
+            if im.mode == "1":
+                options["compression"] = "group4"
+            else:
+                options["compression"] = "tiff_lzw"
+        return options
+
+    def save(self, im, fp, dpi=None):
+        """Encode ``im`` into ``fp`` (filename or file object)
+
+        A file is written under a temporary name and renamed when it
+        is complete, thus nobody reading the page images sees a
+        truncated one. ``dpi`` overrides the resolution.
+        """
+        options = self.save_options(im)
+        if dpi is not None and "dpi" in options:
+            options["dpi"] = dpi
+        if isinstance(fp, str):
+            with replacing(fp) as f:
+                im.save(f, **options)
+        else:
+            im.save(fp, **options)
+
+    def manifest_entry(self, idx, pdf_digest):
+        """Manifest entry for the image of page ``idx``"""
+        return {
+            "pdf": pdf_digest,
+            "page": idx,
+            "resolution": self.resolution,
+            "colormode": self.colormode,
+            "format": self.image_format,
+            "quality": self.quality,
+            "compress_level": self.compress_level,
+            "optimize": self.optimize,
+            "progressive": self.progressive,
+            "embedded": self.embedded,
+            "pyramid": self.pyramid,
+            "tile_size": self.tile_size if self.pyramid else None,
+            "thumbnail_size": self.thumbnail_size,
+        }
+
+    @property
+    def derivatives(self):
+        """Are pyramids or thumbnails to be written?"""
+        return bool(self.pyramid or self.thumbnail_size)
+
+    def write_derivatives(self, idx, im):
+        """Write tile pyramid and thumbnail of page ``idx`` from ``im``"""
+        name = os.path.splitext(os.path.basename(self.image_name(idx)))[0]
+        tiledir = os.path.join(self.imdir, "tiles")
+        if self.pyramid == "dzi":
+            write_dzi(im, tiledir, name, self.tile_size, quality=self.quality)
+        elif self.pyramid == "iiif":
+            write_iiif(im, tiledir, name, self.tile_size,
+                    base_url=self.iiif_base_url, quality=self.quality)
+        if self.thumbnail_size:
+            write_thumbnail(
+                    im, os.path.join(self.imdir, "thumbs", name + ".jpg"),
+                    self.thumbnail_size, quality=self.quality)
+
+    def apply_colormode(self, im):
+        """Convert ``im`` according to the colormode
+
+        Returns the image and the colorspace chosen for it.
+        """
+        if self.colormode == "bitonal":
+            return to_bitonal(im), "bitonal"
+        if self.colormode == "gray":
+            return im.convert("L") if im.mode != "L" else im, "gray"
+        if self.colormode == "auto":
+            if im.mode in ("L", "1"):
+                return im, "bitonal" if im.mode == "1" else "gray"
+            if im.mode != "RGB":
+                im = im.convert("RGB")
+            if not has_color(im):
+                return im.convert("L"), "gray"
+            return im, "rgb"
+        return im.convert("RGB") if im.mode != "RGB" else im, "rgb"
+
+    def embedded_scan(self, idx):
+        """The single raster image that makes up page ``idx`` (0-based)
+
+        A page qualifies if it consists of one upright, unmasked image
+        covering the whole page, with no vector graphics and no visible
+        text (an invisible OCR layer is fine). Returns the xref of the
+        image or ``None``.
+        """
+        page = self.open()[idx]
+        if page.rotation:
+            return None
+        images = page.get_images(full=True)
+        if len(images) != 1:
+            return None
+        xref, smask = images[0][0], images[0][1]
+        if smask:
+            return None
+        try:
+            rects = page.get_image_rects(xref, transform=True)
+        except Exception:
+            # an image MuPDF cannot load, see write_embedded
+            return None
+        if len(rects) != 1:
+            return None
+        rect, matrix = rects[0]
+        if matrix.b or matrix.c or matrix.a <= 0 or matrix.d <= 0:
+            return None
+        tolerance = 1.0  # points
+        if abs(rect.x0 - page.rect.x0) > tolerance \
+                or abs(rect.y0 - page.rect.y0) > tolerance \
+                or abs(rect.x1 - page.rect.x1) > tolerance \
+                or abs(rect.y1 - page.rect.y1) > tolerance:
+            return None
+        if page.get_drawings():
+            return None
+        for span in page.get_texttrace():
+            if span["type"] != 3:  # 3: invisible text
+                return None
+        return xref
+
+    def write_embedded(self, idx, xref, on_image=None):
+        """Write the embedded scan ``xref`` as image of page ``idx``
+
+        If the image is stored in the configured format (e.g. a
+        DCT-encoded image and JPEG output), its data are written as
+        they are. Otherwise the image is decoded (not rendered) and
+        saved in the configured format; the colormode only ever reduces
+        the colors of the scan. Returns the same
+        as :meth:`render`, the info contains the effective resolution
+        of the image in ``dpi``, or ``None`` if the image cannot be
+        extracted or decoded (e.g. JBIG2), so that the page has to be
+        rendered.
+        """
+        on_image = on_image or _no_image
+        pdf = self.open()
+        page = pdf[idx]
+        try:
+            data = pdf.extract_image(xref)
+            # the header at least, even if the data are copied as they are
+            im = Image.open(io.BytesIO(data["image"]))
+        except Exception as err:
+            logging.warning("Page %d: cannot read the embedded scan (%s), "
+                            "rendering the page", idx + 1, err)
+            return None
+        dpi = (data["width"]/page.rect.width*72,
+               data["height"]/page.rect.height*72)
+        name = self.image_name(idx)
+        native = {1: "gray", 3: "rgb"}.get(data["colorspace"])
+        if data.get("bpc") == 1 and native == "gray":
+            native = "bitonal"
+        # scans are never inflated to a richer colormode, only reduced
+        rank = {"bitonal": 0, "gray": 1, "rgb": 2, "auto": 2}
+        keep = native is not None \
+                and rank[native] <= rank[self.colormode]
+        if keep and IMAGE_FORMATS.get(data["ext"]) == \
+                IMAGE_FORMATS[self.image_format]:
+            with replacing(name) as f:
+                f.write(data["image"])
+            colorspace = native
+            if self.derivatives:
+                self.write_derivatives(idx, im)
+            # the file is the scan itself, nothing is lost reading it
+            on_image(idx, name, None, dpi)
+        else:
+            try:
+                im.load()
+            except OSError as err:
+                logging.warning("Page %d: cannot decode the embedded scan "
+                                "(%s), rendering the page", idx + 1, err)
+                return None
+            if keep:
+                colorspace = native
+            else:
+                im, colorspace = self.apply_colormode(im)
+            self.save(im, name, dpi=dpi)
+            if self.derivatives:
+                self.write_derivatives(idx, im)
+            on_image(idx, name, im, dpi)
+        return name, {"colorspace": colorspace, "source": "embedded",
+                      "dpi": list(dpi)}
+
+    def render(self, idx, on_image=None):
+        """Render page ``idx`` (0-based)
+
+        Returns the image filename and a dict with information about
+        the page image: ``colorspace`` is the colormode chosen for the
+        page (``rgb``, ``gray`` or ``bitonal``).
+
+        With ``embedded`` set, pages that are a single scan are written
+        from the embedded image (see :meth:`write_embedded`).
+
+        ``on_image(idx, filename, image, dpi)`` is called once the page
+        image is written, with the image itself while it is still in
+        memory; ``image`` is ``None`` if there is no page image in
+        memory (PNG files written in bands, embedded scans written as
+        they are).
+        """
+        on_image = on_image or _no_image
+        if self.embedded:
+            xref = self.embedded_scan(idx)
+            if xref is not None:
+                result = self.write_embedded(idx, xref, on_image)
+                if result is not None:
+                    return result
+        if self.colormode in ("gray", "bitonal"):
+            colorspace = "gray"
+        else:
+            colorspace = "rgb"
+        matrix = fitz.Matrix(
+                float(self.resolution)/72,
+                float(self.resolution)/72
+            )
+        if self.memory_limit:
+            irect = (self.open()[idx].rect * matrix).irect
+            n = 1 if colorspace == "gray" else 3
+            if irect.width * irect.height * n > self.memory_limit * 2**20:
+                return self.render_tiled(idx, on_image)
+        pix = self.open().get_page_pixmap(
+                idx,
+                matrix=matrix,
+                colorspace=colorspace.upper(),
+                alpha=False
+            )
+        im, colorspace = self.apply_colormode(pixmap_to_image(pix))
+        name = self.image_name(idx)
+        self.save(im, name)
+        if self.derivatives:
+            self.write_derivatives(idx, im)
+        on_image(idx, name, im, (self.resolution, self.resolution))
+        # release the image before the pixmap whose buffer it may use
+        del im
+        del pix
+        return name, {"colorspace": colorspace}
+
+    def render_tiled(self, idx, on_image=None):
+        """Render page ``idx`` (0-based) in horizontal bands
+
+        Every band takes at most half of ``memory_limit`` (twice: as
+        pixmap and as PIL image) and is written to the PNG file at
+        once, so memory stays within the limit.
+        """
+        on_image = on_image or _no_image
+        page = self.open()[idx]
+        matrix = fitz.Matrix(
+                float(self.resolution)/72,
+                float(self.resolution)/72
+            )
+        irect = (page.rect * matrix).irect
+        if self.colormode == "auto":
+            # decide on a preview, the file header needs the mode
+            preview = page.get_pixmap(
+                    matrix=matrix * 0.25, colorspace="RGB", alpha=False)
+            colorspace = "rgb" if has_color(pixmap_to_image(preview)) \
+                    else "gray"
+            del preview
+        else:
+            colorspace = self.colormode
+        mode = {"rgb": "RGB", "gray": "L", "bitonal": "1"}[colorspace]
+        rows = max(16, self.memory_limit * 2**20 // 2 // (irect.width * 4))
+        logging.info("Rendering page %d in bands of %d rows",
+                idx + 1, rows)
+        name = self.image_name(idx)
+        dpi = (self.resolution, self.resolution)
+        displaylist = page.get_displaylist()
+        with replacing(name) as outfile:
+            writer = PNGWriter(outfile, (irect.width, irect.height), mode,
+                    dpi=dpi, compress_level=self.compress_level)
+            for y in range(irect.y0, irect.y1, rows):
+                band = fitz.IRect(irect.x0, y, irect.x1,
+                                  min(y + rows, irect.y1))
+                pix = displaylist.get_pixmap(
+                        matrix=matrix,
+                        colorspace=fitz.csRGB if mode == "RGB"
+                                else fitz.csGRAY,
+                        alpha=False,
+                        clip=fitz.Rect(band) * ~matrix)
+                im = pixmap_to_image(pix)
+                if mode == "1":
+                    im = to_bitonal(im)
+                # align the clipped pixmap with the band (copies the data)
+                im = im.crop((band.x0 - pix.x, band.y0 - pix.y,
+                              band.x1 - pix.x, band.y1 - pix.y))
+                del pix
+                writer.write(im.tobytes())
+                del im
+            writer.close()
+        if self.derivatives:
+            logging.warning(
+                    "Page %d: no pyramid/thumbnail for banded PNG "
+                    "output", idx + 1)
+        on_image(idx, name, None, dpi)
+        return name, {"colorspace": colorspace}
+
+
+def _no_image(idx, filename, image, dpi):
+    pass
+
+
+class ImagePageSource(object):
+    """Snippets of a page, cropped from its rendered page image"""
+
+    def __init__(self, filename, dpi):
+        self.name = filename
+        self.dpi = dpi
+        self.img = Image.open(filename)
+        self.size = self.img.size
+
+    def crop(self, box):
+        """Snippet for ``box`` (pixel coordinates of the page image)"""
+        img = self.img.crop(box)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        return img
+
+    def close(self):
+        self.img.close()
+
+
+class MemoryPageSource(ImagePageSource):
+    """Snippets of a page, cropped from its page image in memory (while
+    it is rendered), thus without decoding the written file
+    """
+
+    def __init__(self, img, filename, dpi):
+        self.name = filename
+        self.dpi = dpi
+        self.img = img
+        self.size = img.size
+
+    def close(self):
+        # the image belongs to the renderer
+        self.img = None
+
+
+class PDFPageSource(object):
+    """Snippets of a page, rendered from the PDF for their clip rectangle
+
+    Pixel coordinates are those of a full page image rendered at
+    ``resolution``, thus the snippets are the same as crops from such
+    an image, but neither the full page nor a JPEG round trip is needed.
+    """
+
+    def __init__(self, pdf, idx, resolution):
+        self.page = pdf[idx]
+        self.name = "{}, page {}".format(pdf.name, idx + 1)
+        self.dpi = (resolution, resolution)
+        self.matrix = fitz.Matrix(
+                float(resolution)/72, float(resolution)/72)
+        irect = (self.page.rect * self.matrix).irect
+        self.size = (irect.width, irect.height)
+
+    def crop(self, box):
+        """Snippet for ``box`` (pixel coordinates of the page image)"""
+        box = [int(x) for x in box]
+        pix = self.page.get_pixmap(
+                matrix=self.matrix,
+                clip=fitz.Rect(box) * ~self.matrix,
+                colorspace="RGB",
+                alpha=False)
+        # like Image.crop: always the size of box, black outside the page
+        img = Image.new("RGB", (box[2] - box[0], box[3] - box[1]))
+        if pix.w and pix.h:
+            img.paste(pixmap_to_image(pix), (pix.x - box[0], pix.y - box[1]))
+        return img
+
+    def close(self):
+        self.page = None
+
+
+def _render_page(on_image, renderer, idx):
+    return (idx,) + renderer.render(idx, on_image)
+
+def render_pages(indexes, workers=1, on_image=None, **settings):
+    """Render the pages ``indexes`` (0-based), using ``workers`` processes
+
+    ``settings`` are passed to :class:`PageRenderer`. The results
+    ``(idx, filename, info)`` are yielded in the order of ``indexes``,
+    regardless of the order in which the workers finish.
+    ``on_image`` (see :meth:`PageRenderer.render`) is called in the
+    process rendering the page, thus it has to be picklable.
+    """
+    return map_jobs(functools.partial(_render_page, on_image), indexes,
+                    functools.partial(PageRenderer, **settings), workers)
@@ -50,6 +50,102 @@ def main():
             type=int,
             dest="resolution",
             metavar="RESOLUTION")
+    parser.add_argument(
+            "--format",
+            help=u"file format of created images (defaults to jpeg, "
+                 u"tiff uses Group 4 compression for bitonal pages)",
+            default="jpeg",
+            choices=["jpeg", "png", "webp", "tiff"],
+            dest="image_format")
+    parser.add_argument(
+            "--color",
+            help=u"colormode of created images: rgb (default), gray, "
+                 u"bitonal, or auto (rgb only for pages with color, "
+                 u"gray otherwise)",
+            default="rgb",
+            choices=["rgb", "gray", "bitonal", "auto"],
+            dest="colormode")
+    parser.add_argument(
+            "--embedded",
+            help=u"for pages consisting of a single scanned image, "
+                 u"write out that image instead of rendering the page",
+            default=False,
+            action="store_true",
+            dest="embedded_images")
+    parser.add_argument(
+            "--memory-limit",
+            help=u"render pages whose pixmap would exceed MB megabytes "
+                 u"in bands written one by one (needs --format png)",
+            default=None,
+            type=int,
+            dest="memory_limit",
+            metavar="MB")
+    parser.add_argument(
+            "--pyramid",
+            help=u"also write a tile pyramid of every page into "
+                 u"IMAGEDIR/tiles: Deep Zoom (dzi) or static IIIF "
+                 u"level 0 tiles (iiif)",
+            default=None,
+            choices=["dzi", "iiif"],
+            dest="pyramid")
+    parser.add_argument(
+            "--tile-size",
+            help=u"size of pyramid tiles (defaults to 256)",
+            default=256,
+            type=int,
+            dest="tile_size",
+            metavar="TILESIZE")
+    parser.add_argument(
+            "--iiif-base-url",
+            help=u"URL of IMAGEDIR/tiles/ for the ids in info.json",
+            default="",
+            type=str,
+            dest="iiif_base_url",
+            metavar="URL")
+    parser.add_argument(
+            "--thumbnails",
+            help=u"also write thumbnails (at most SIZE pixels wide and "
+                 u"high) into IMAGEDIR/thumbs",
+            default=None,
+            type=int,
+            dest="thumbnail_size",
+            metavar="SIZE")
+    parser.add_argument(
+            "-q",
+            "--quality",
+            help=u"JPEG/WebP quality of created images (defaults to 85)",
+            default=85,
+            type=int,
+            dest="quality",
+            metavar="QUALITY")
+    parser.add_argument(
+            "--compress-level",
+            help=u"PNG compression level (0-9) or WebP method (0-6)",
+            default=None,
+            type=int,
+            dest="compress_level",
+            metavar="LEVEL")
+    parser.add_argument(
+            "--optimize",
+            help=u"optimize JPEG/PNG encoding (slower, smaller files)",
+            default=False,
+            action="store_true",
+            dest="optimize")
+    parser.add_argument(
+            "--progressive",
+            help=u"write progressive JPEG files",
+            default=False,
+            action="store_true",
+            dest="progressive")
+    parser.add_argument(
+            "-j",
+            "--jobs",
+            help=u"number of worker processes for image creation, "
+                 u"XML extraction and writing snippets (defaults to 1)",
+            default=1,
+            type=int,
+            dest="workers",
+            metavar="JOBS")
     parser.add_argument(
             "-v",
             "--version",
@@ -62,6 +158,59 @@ def main():
             default=True,
             action="store_false",
             dest="make_images")
+    parser.add_argument(
+            "--force-images",
+            help=u"render all images, even if they are up to date",
+            default=False,
+            action="store_true",
+            dest="force_images")
+    parser.add_argument(
+            "--font-pages",
+            help=u"extract XML first, then render only the pages "
+                 u"needed for the font index",
+            default=False,
+            action="store_true",
+            dest="font_pages_first")
+    parser.add_argument(
+            "--remaining-images",
+            help=u"with --font-pages: render the remaining pages in the "
+                 u"background while the font index is written",
+            default=False,
+            action="store_true",
+            dest="remaining_images")
+    parser.add_argument(
+            "--snippets",
+            help=u"source of the snippets in the font index: crop them "
+                 u"from the page images (default), crop them while the "
+                 u"page images are rendered (unless -s, no page image "
+                 u"is read back) or render them from the PDF (no "
+                 u"page images needed)",
+            default="images",
+            choices=["images", "render", "pdf"],
+            dest="snippet_source")
+    parser.add_argument(
+            "--snippet-res",
+            help=u"resolution of snippets rendered from the PDF "
+                 u"(defaults to RESOLUTION)",
+            default=None,
+            type=int,
+            dest="snippet_resolution",
+            metavar="SNIPPETRES")
+    parser.add_argument(
+            "--atlas",
+            help=u"pack the snippets of every font into atlas images "
+                 u"(and others for the line snippets) instead of "
+                 u"writing two files per character",
+            default=False,
+            action="store_true",
+            dest="atlas")
+    parser.add_argument(
+            "--split-index",
+            help=u"write one HTML page per font, linked from the font "
+                 u"index page, with lazily loaded snippets",
+            default=False,
+            action="store_true",
+            dest="split_index")
     parser.add_argument(
             "-x",
             "--no-xml",
@@ -85,6 +234,123 @@ def main():
             default=None,
             dest="font_corrector_filename",
             metavar="FC_CORRECTOR_LOADER")
+    parser.add_argument(
+            "--engine",
+            help=u"extract the XML with PDFMiner (default) or with the "
+                 u"faster PyMuPDF (no font correctors)",
+            default="pdfminer",
+            choices=("pdfminer", "pymupdf"),
+            dest="engine")
+    parser.add_argument(
+            "--layout",
+            help=u"layout analysis: full (default, PDFMiner's), lines "
+                 u"(PDFMiner's text lines and boxes without the grouping "
+                 u"of the boxes, much faster) or grid (anapdf's "
+                 u"near-linear analysis, boxes in reading order)",
+            default="full",
+            choices=("full", "lines", "grid"),
+            dest="layout")
+    parser.add_argument(
+            "--line-overlap",
+            help=u"LAParams line_overlap (default: 0.5)",
+            default=None,
+            type=float,
+            dest="line_overlap")
+    parser.add_argument(
+            "--char-margin",
+            help=u"LAParams char_margin (default: 2.0)",
+            default=None,
+            type=float,
+            dest="char_margin")
+    parser.add_argument(
+            "--line-margin",
+            help=u"LAParams line_margin (default: 0.5)",
+            default=None,
+            type=float,
+            dest="line_margin")
+    parser.add_argument(
+            "--word-margin",
+            help=u"LAParams word_margin (default: 0.1)",
+            default=None,
+            type=float,
+            dest="word_margin")
+    parser.add_argument(
+            "--boxes-flow",
+            help=u"LAParams boxes_flow, -1.0 to 1.0 (default: 0.5)",
+            default=None,
+            type=float,
+            dest="boxes_flow")
+    parser.add_argument(
+            "--detect-vertical",
+            help=u"LAParams detect_vertical",
+            default=None,
+            action="store_true",
+            dest="detect_vertical")
+    parser.add_argument(
+            "--all-texts",
+            help=u"LAParams all_texts: analyze text in figures too",
+            default=None,
+            action="store_true",
+            dest="all_texts")
+    parser.add_argument(
+            "--page-timeout",
+            help=u"time limit per page in seconds for the XML extraction; "
+                 u"pages over it are retried with layout grid or written "
+                 u"empty with a status attribute",
+            default=None,
+            type=float,
+            dest="page_timeout",
+            metavar="SECONDS")
+    parser.add_argument(
+            "--page-memory",
+            help=u"memory limit per page of the XML extraction in MB "
+                 u"(address space), pages over it are treated as with "
+                 u"--page-timeout",
+            default=None,
+            type=int,
+            dest="page_memory",
+            metavar="MB")
+    parser.add_argument(
+            "--no-retry",
+            help=u"do not retry pages over budget, write them empty",
+            default=True,
+            action="store_false",
+            dest="retry_pages")
+    parser.add_argument(
+            "--no-journal",
+            help=u"do not journal the extracted pages (an interrupted "
+                 u"extraction starts from the beginning)",
+            default=True,
+            action="store_false",
+            dest="journal")
+    parser.add_argument(
+            "--discard-journal",
+            help=u"discard the journal of an interrupted extraction "
+                 u"instead of resuming it",
+            default=False,
+            action="store_true",
+            dest="discard_journal")
+    parser.add_argument(
+            "--no-cache",
+            help=u"neither read nor store the extracted XML in the cache",
+            default=True,
+            action="store_false",
+            dest="cache")
+    parser.add_argument(
+            "--cache-dir",
+            help=u"directory of the extraction cache "
+                 u"(default: ~/.cache/anapdf)",
+            default=None,
+            dest="cache_dir",
+            metavar="DIR")
+    parser.add_argument(
+            "--cache-size",
+            help=u"maximum size of the extraction cache in MB, least "
+                 u"recently used entries are deleted (default: 1024)",
+            default=None,
+            type=int,
+            dest="cache_size",
+            metavar="MB")
     parser.add_argument(
             "-o",
             "--outfile",
@@ -130,6 +396,9 @@ def main():
     else:
         args = vars(args)
     args["scales"] = (args["horz"], args["vert"])
+    args["laparams"] = dict((key, args[key]) for key in (
+        "line_overlap", "char_margin", "line_margin", "word_margin",
+        "boxes_flow", "detect_vertical", "all_texts"))
     a = anapdf.Analyzer(**args)
     a.analyze()
 
@@ -0,0 +1,63 @@
+# -*- coding: UTF-8 -*-
+
+"""
+anapdf-compare
+
+Compare the XML extraction with PDFMiner and with PyMuPDF: time and
+memory per page, and the differences of the results.
+"""
+
+import argparse
+
+import anapdf
+from anapdf.compare import compare, report, parse_pages
+from anapdf.extraction import ENGINES
+
+def main():
+    """Run both extraction engines on a PDF file and compare them"""
+    description = "Compare the XML extraction engines on a PDF file."
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+            "pdffile",
+            metavar="PDFFILE",
+            type=str,
+            help=u"the PDF file to extract")
+    parser.add_argument(
+            "-p",
+            "--pages",
+            help=u"pages to extract, e.g. ``1-10,15`` (default: all)",
+            default="",
+            dest="pages",
+            metavar="PAGES")
+    parser.add_argument(
+            "-t",
+            "--tolerance",
+            help=u"maximum deviation of character boxes in points "
+                 u"(default: 1.0)",
+            default=1.0,
+            type=float,
+            dest="tolerance")
+    parser.add_argument(
+            "-e",
+            "--examples",
+            help=u"number of examples per page and kind of difference "
+                 u"(default: 3, 0 for none)",
+            default=3,
+            type=int,
+            dest="examples")
+    parser.add_argument(
+            "-v",
+            "--version",
+            action="version",
+            version="%(prog)s {version}".format(version=anapdf.__version__))
+    args = parser.parse_args()
+    extractor = ENGINES["pymupdf"](args.pdffile)
+    indexes = parse_pages(args.pages, extractor.page_count)
+    extractor.close()
+    engines = ("pdfminer", "pymupdf")
+    results, diffs = compare(
+            args.pdffile, indexes, engines, tolerance=args.tolerance)
+    report(results, diffs, engines, examples=args.examples)
+
+if __name__ == "__main__":
+    main()
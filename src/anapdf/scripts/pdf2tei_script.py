@@ -75,6 +75,124 @@ def main():
         dest="font_corrector_filename",
         metavar="FC_CORRECTOR_LOADER"
     )
+    parser.add_argument(
+        "--engine",
+        help=u"extract the XML with PDFMiner (default) or with the "
+             u"faster PyMuPDF (no font correctors)",
+        default="pdfminer",
+        choices=("pdfminer", "pymupdf"),
+        dest="engine"
+    )
+    parser.add_argument(
+        "--layout",
+        help=u"layout analysis: full (default, PDFMiner's), lines "
+             u"(PDFMiner's text lines and boxes without the grouping "
+             u"of the boxes, much faster) or grid (anapdf's "
+             u"near-linear analysis, boxes in reading order)",
+        default="full",
+        choices=("full", "lines", "grid"),
+        dest="layout"
+    )
+    parser.add_argument(
+        "--line-overlap",
+        help=u"LAParams line_overlap (default: 0.5)",
+        default=None,
+        type=float,
+        dest="line_overlap"
+    )
+    parser.add_argument(
+        "--char-margin",
+        help=u"LAParams char_margin (default: 2.0)",
+        default=None,
+        type=float,
+        dest="char_margin"
+    )
+    parser.add_argument(
+        "--line-margin",
+        help=u"LAParams line_margin (default: 0.5)",
+        default=None,
+        type=float,
+        dest="line_margin"
+    )
+    parser.add_argument(
+        "--word-margin",
+        help=u"LAParams word_margin (default: 0.1)",
+        default=None,
+        type=float,
+        dest="word_margin"
+    )
+    parser.add_argument(
+        "--boxes-flow",
+        help=u"LAParams boxes_flow, -1.0 to 1.0 (default: 0.5)",
+        default=None,
+        type=float,
+        dest="boxes_flow"
+    )
+    parser.add_argument(
+        "--detect-vertical",
+        help=u"LAParams detect_vertical",
+        default=None,
+        action="store_true",
+        dest="detect_vertical"
+    )
+    parser.add_argument(
+        "--all-texts",
+        help=u"LAParams all_texts: analyze text in figures too",
+        default=None,
+        action="store_true",
+        dest="all_texts"
+    )
+    parser.add_argument(
+        "--page-timeout",
+        help=u"time limit per page in seconds for the XML extraction; "
+             u"pages over it are retried with layout grid or written "
+             u"empty with a status attribute",
+        default=None,
+        type=float,
+        dest="page_timeout",
+        metavar="SECONDS"
+    )
+    parser.add_argument(
+        "--page-memory",
+        help=u"memory limit per page of the XML extraction in MB "
+             u"(address space), pages over it are treated as with "
+             u"--page-timeout",
+        default=None,
+        type=int,
+        dest="page_memory",
+        metavar="MB"
+    )
+    parser.add_argument(
+        "--no-retry",
+        help=u"do not retry pages over budget, write them empty",
+        default=True,
+        action="store_false",
+        dest="retry_pages"
+    )
+    parser.add_argument(
+        "--no-cache",
+        help=u"neither read nor store the extracted XML in the cache",
+        default=True,
+        action="store_false",
+        dest="cache"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help=u"directory of the extraction cache "
+             u"(default: ~/.cache/anapdf)",
+        default=None,
+        dest="cache_dir",
+        metavar="DIR"
+    )
+    parser.add_argument(
+        "--cache-size",
+        help=u"maximum size of the extraction cache in MB, least "
+             u"recently used entries are deleted (default: 1024)",
+        default=None,
+        type=int,
+        dest="cache_size",
+        metavar="MB"
+    )
     parser.add_argument(
         "-l",
         "--logging",
@@ -116,7 +234,19 @@ def main():
         fontencfile=args.fontencfile,
         font_correctors=font_correctors,
         default_font_size=basesize,
-        replace_soft_hyphen=True
+        replace_soft_hyphen=True,
+        font_corrector_filename=args.font_corrector_filename,
+        cache=args.cache,
+        cache_dir=args.cache_dir,
+        cache_size=args.cache_size,
+        engine=args.engine,
+        layout=args.layout,
+        laparams=dict((key, getattr(args, key)) for key in (
+            "line_overlap", "char_margin", "line_margin", "word_margin",
+            "boxes_flow", "detect_vertical", "all_texts")),
+        page_timeout=args.page_timeout,
+        page_memory=args.page_memory,
+        retry_pages=args.retry_pages
     )
     conv.convert(args.stop_after)
     if args.output == "-":
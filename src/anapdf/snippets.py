@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Character and line snippets of the font index
+
+The snippets of a page are cropped from its page image
+(:class:`anapdf.render.ImagePageSource`), from the page image still in
+memory while it is rendered (:class:`PageSnippetWriter`) or rendered
+from the PDF (:class:`anapdf.render.PDFPageSource`); the pages are
+independent of each other and can be written by several worker
+processes.
+"""
+
+import os.path
+import logging
+import functools
+
+import fitz
+from PIL import Image, ImageDraw
+
+from .render import ImagePageSource, MemoryPageSource, PDFPageSource
+from .workers import map_jobs
+
+
+def write_snippets(source, items, outdir, ext="jpg"):
+    """Write the character and line snippets of one page
+
+    Args:
+        source: :class:`ImagePageSource` or :class:`PDFPageSource`
+            of the page
+        items (list): ``(imnum, bbox, linebox)`` of the snippets
+        outdir (str): directory for the snippet files
+    """
+    for imnum, bbox, linebox in items:
+        imgfilename = os.path.join(outdir, "outpic%d.%s" % (imnum, ext))
+        box = [float(x) for x in bbox.split(",")]
+        box = [x/float(72)*source.dpi[i % 2] for i, x in enumerate(box)]
+        tmp = source.size[1] - box[1]
+        box[1] = source.size[1] - box[3]
+        box[3] = tmp
+        box = [int(x) for x in box]
+        # Problem with some combining diacritical characters
+        # in Junicode font: they seem to have to vertical
+        # extension, thus x1 and x2 are the same. This leads
+        # to problems with the cropbox. Thus: if x- or y-values
+        # are the same, we extend the cropbox.
+        oldbox = None
+        if box[0] == box[2]:
+            oldbox = [x for x in box]
+            box[0] -= 5
+            box[2] += 5
+            if box[0] < 0:
+                box[0] = 0
+        if box[1] == box[3]:
+            if not oldbox:
+                oldbox = [x for x in box]
+            box[1] -= 5
+            box[3] += 5
+            if box[1] < 0:
+                box[1] = 0
+        if oldbox:
+            logging.info("Corrected cropbox %s --> %s",
+                oldbox,
+                box
+            )
+        try:
+            img2 = source.crop(box)
+        except (MemoryError,) as memerr:
+            logging.error(
+                ("%s: imagefilename: %s, box: %s, img: %s, "
+                 "bbox: %s, size: (%d, %d)"),
+                 memerr,
+                 imgfilename,
+                 box,
+                 source.name,
+                 bbox,
+                 source.size[0],
+                 source.size[1]
+            )
+            raise
+        try:
+            img2.save(imgfilename)
+        except (SystemError,) as syserr:
+            logging.error(
+                ("%s: imagefilename: %s, box: %s, img: %s,"
+                 "bbox: %s, size: (%d, %d)"),
+                syserr,
+                imgfilename,
+                box,
+                source.name,
+                bbox,
+                source.size[0],
+                source.size[1]
+            )
+            raise
+        del img2
+        imgfilename = os.path.join(outdir, "linepic%d.%s" % (imnum, ext))
+        box2 = [float(x) for x in linebox.split(",")]
+        box2 = [x/float(72)*source.dpi[i % 2]
+                for i, x in enumerate(box2)]
+        tmp = source.size[1] - box2[1]
+        box2[1] = source.size[1] - box2[3]
+        box2[3] = tmp
+        box2 = [int(x) for x in box2]
+        img2 = source.crop(box2)
+        draw = ImageDraw.Draw(img2)
+        draw.line([box[0]-box2[0], box[3]-box2[1],
+            box[2]-box2[0], box[3]-box2[1]], fill=0x0000ff, width=14)
+        img2.save(imgfilename)
+        del img2
+
+def page_source(pdf, idx, name, dpi):
+    """The source of the snippets of page ``idx`` (0-based)
+
+    ``pdf`` is the opened PDF file to render the snippets from with
+    resolution ``dpi``, or ``None`` to crop them from the page image
+    ``name`` with ``dpi`` (horizontal, vertical).
+    """
+    if pdf is not None:
+        return PDFPageSource(pdf, idx, dpi)
+    return ImagePageSource(name, dpi)
+
+
+class PageSnippetWriter(object):
+    """Write the snippets of the pages while they are rendered, as
+    ``on_image`` of :func:`anapdf.render.render_pages`
+
+    ``pages`` are ``{idx: items}`` (see :func:`write_snippets`); the
+    snippets are cropped from the page image in memory, or from the
+    written file if there is none.
+    """
+
+    def __init__(self, pages, outdir, ext="jpg"):
+        self.pages = pages
+        self.outdir = outdir
+        self.ext = ext
+
+    def __call__(self, idx, name, image, dpi):
+        items = self.pages.get(idx)
+        if not items:
+            return
+        if image is not None:
+            source = MemoryPageSource(image, name, dpi)
+        else:
+            source = ImagePageSource(name, dpi)
+        try:
+            write_snippets(source, items, self.outdir, self.ext)
+        finally:
+            source.close()
+
+def _open_pdf(pdffile):
+    if pdffile is not None:
+        return fitz.open(pdffile)
+
+def _write_page(pdf, job):
+    idx, name, dpi, items, outdir, ext = job
+    source = page_source(pdf, idx, name, dpi)
+    try:
+        write_snippets(source, items, outdir, ext)
+    finally:
+        source.close()
+    return idx
+
+def write_page_snippets(jobs, outdir, pdffile=None, workers=1, ext="jpg"):
+    """Write the snippets of several pages, using ``workers`` processes
+
+    ``jobs`` are ``(idx, name, dpi, items)``, see :func:`page_source`
+    and :func:`write_snippets`; with ``pdffile``, the snippets are
+    rendered from it. The file names depend on the snippet numbers
+    only, thus the result is the same for any number of workers.
+    """
+    jobs = [job + (outdir, ext) for job in jobs]
+    shard = len(jobs)//(min(workers or 1, len(jobs) or 1)*4)
+    for _ in map_jobs(_write_page, jobs,
+                      functools.partial(_open_pdf, pdffile), workers,
+                      chunksize=max(1, shard), ordered=False):
+        pass
+
+
+#: width of an atlas in pixels (unless a snippet is wider)
+ATLAS_WIDTH = 2048
+
+#: maximum height of an atlas sheet in pixels (unless a snippet is
+#: higher), well below the 65500 pixels of JPEG
+ATLAS_HEIGHT = 16384
+
+def pack_atlas(filenames, atlasname, **options):
+    """Pack the images ``filenames`` into the atlas sheets ``atlasname
+    % sheet`` (saved with the PIL ``options``)
+
+    The images are placed left to right in rows of at most
+    :data:`ATLAS_WIDTH` pixels, a row that would make a sheet higher
+    than :data:`ATLAS_HEIGHT` starts the next sheet. Returns the boxes
+    ``[(sheet, x, y, width, height)]`` of the images and the sizes
+    ``[(width, height)]`` of the sheets.
+    """
+    sizes = []
+    for filename in filenames:
+        with Image.open(filename) as img:
+            sizes.append(img.size)
+    width = max([ATLAS_WIDTH] + [w for w, h in sizes])
+    boxes = []
+    sheet = x = y = rowheight = 0
+    for w, h in sizes:
+        if x + w > width:
+            x, y, rowheight = 0, y + rowheight, 0
+        if y > 0 and y + max(rowheight, h) > ATLAS_HEIGHT:
+            sheet, x, y, rowheight = sheet + 1, 0, 0, 0
+        boxes.append((sheet, x, y, w, h))
+        x += w
+        rowheight = max(rowheight, h)
+    sheets = []
+    for sheet in range(sheet + 1):
+        sheetboxes = [(fn, box[1:]) for fn, box in zip(filenames, boxes)
+                      if box[0] == sheet]
+        size = (max([1] + [x + w for fn, (x, y, w, h) in sheetboxes]),
+                max([1] + [y + h for fn, (x, y, w, h) in sheetboxes]))
+        atlas = Image.new("RGB", size, "white")
+        for filename, (x, y, w, h) in sheetboxes:
+            with Image.open(filename) as img:
+                atlas.paste(img, (x, y))
+        atlas.save(atlasname % sheet, **options)
+        atlas.close()
+        sheets.append(size)
+    return boxes, sheets
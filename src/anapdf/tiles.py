@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Tile pyramids and thumbnails of page images
+
+The pyramids are written from the page image in memory, the levels
+are obtained by halving the previous level with ``Image.reduce``.
+
+- ``dzi``: Deep Zoom, ``NAME.dzi`` and ``NAME_files/LEVEL/COL_ROW.jpg``
+- ``iiif``: static IIIF Image API 3.0 level 0 tiles, ``NAME/info.json``
+  and ``NAME/REGION/SIZE/0/default.jpg``
+"""
+
+import os
+import os.path
+import math
+import json
+import shutil
+
+PYRAMIDS = ("dzi", "iiif")
+
+DZI_TEMPLATE = u"""\
+<?xml version="1.0" encoding="UTF-8"?>
+<Image xmlns="http://schemas.microsoft.com/deepzoom/2008"
+  TileSize="{tile_size}" Overlap="{overlap}" Format="jpg">
+  <Size Width="{width}" Height="{height}"/>
+</Image>
+"""
+
+
+def _levels(im):
+    """Yield ``(factor, image)``, halving ``im`` down to one pixel"""
+    if im.mode not in ("L", "RGB"):
+        im = im.convert("L")
+    factor = 1
+    yield factor, im
+    while im.size[0] > 1 or im.size[1] > 1:
+        im = im.reduce(2)
+        factor *= 2
+        yield factor, im
+
+def _save_tile(im, filename, quality):
+    directory = os.path.dirname(filename)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    im.save(filename, "JPEG", quality=quality)
+
+def write_dzi(im, directory, name, tile_size=256, overlap=0, quality=85):
+    """Write a Deep Zoom pyramid of ``im`` into ``directory``"""
+    width, height = im.size
+    maxlevel = int(math.ceil(math.log(max(width, height), 2)))
+    tiledir = os.path.join(directory, name + "_files")
+    if os.path.isdir(tiledir):
+        shutil.rmtree(tiledir)
+    for factor, level_im in _levels(im):
+        level = maxlevel - int(math.log(factor, 2))
+        w, h = level_im.size
+        for col in range(int(math.ceil(float(w)/tile_size))):
+            for row in range(int(math.ceil(float(h)/tile_size))):
+                x0 = max(col*tile_size - overlap, 0)
+                y0 = max(row*tile_size - overlap, 0)
+                x1 = min((col + 1)*tile_size + overlap, w)
+                y1 = min((row + 1)*tile_size + overlap, h)
+                _save_tile(
+                    level_im.crop((x0, y0, x1, y1)),
+                    os.path.join(tiledir, str(level),
+                                 "{}_{}.jpg".format(col, row)),
+                    quality)
+    with open(os.path.join(directory, name + ".dzi"), "wb") as f:
+        f.write(DZI_TEMPLATE.format(
+            tile_size=tile_size, overlap=overlap,
+            width=width, height=height).encode("UTF-8"))
+
+def write_iiif(im, directory, name, tile_size=256, base_url="",
+               quality=85):
+    """Write static IIIF level 0 tiles of ``im`` into ``directory``
+
+    ``base_url`` is prepended to ``name`` for the ``id`` of the image
+    in ``info.json``.
+    """
+    width, height = im.size
+    imgdir = os.path.join(directory, name)
+    if os.path.isdir(imgdir):
+        shutil.rmtree(imgdir)
+    scale_factors = []
+    sizes = []
+    for factor, level_im in _levels(im):
+        region = tile_size*factor
+        scale_factors.append(factor)
+        for x in range(0, width, region):
+            for y in range(0, height, region):
+                rw = min(region, width - x)
+                rh = min(region, height - y)
+                ow = int(math.ceil(float(rw)/factor))
+                oh = int(math.ceil(float(rh)/factor))
+                tile = level_im.crop(
+                    (x//factor, y//factor, x//factor + ow, y//factor + oh))
+                regions = ["{},{},{},{}".format(x, y, rw, rh)]
+                if rw == width and rh == height:
+                    # the whole image in one tile: also a full size
+                    regions.append("full")
+                    sizes.append({"width": ow, "height": oh})
+                for r in regions:
+                    _save_tile(tile, os.path.join(
+                        imgdir, r, "{},{}".format(ow, oh), "0",
+                        "default.jpg"), quality)
+        if level_im.size[0] <= tile_size and level_im.size[1] <= tile_size:
+            break
+    info = {
+        "@context": "http://iiif.io/api/image/3/context.json",
+        "id": base_url + name,
+        "type": "ImageService3",
+        "protocol": "http://iiif.io/api/image",
+        "profile": "level0",
+        "width": width,
+        "height": height,
+        "tiles": [{"width": tile_size, "scaleFactors": scale_factors}],
+        "sizes": list(reversed(sizes)),
+    }
+    with open(os.path.join(imgdir, "info.json"), "w") as f:
+        json.dump(info, f, indent=1)
+
+def write_thumbnail(im, filename, size, quality=85):
+    """Write a thumbnail of ``im`` with at most ``size`` pixels per side"""
+    thumb = im
+    if thumb.mode not in ("L", "RGB"):
+        thumb = thumb.convert("L")
+    # reduce by integer factors first, it is much cheaper than resizing
+    factor = min(thumb.size[0], thumb.size[1]) // size // 2
+    if factor > 1:
+        thumb = thumb.reduce(factor)
+    else:
+        thumb = thumb.copy()
+    thumb.thumbnail((size, size))
+    _save_tile(thumb, filename, quality)
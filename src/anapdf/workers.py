@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Distribute jobs to worker processes
+
+Each process opens its own state (a renderer, an extractor, a PDF
+file) once with an initializer, the jobs are then run on that state.
+With a single worker, or a single job, the jobs are run in the calling
+process instead.
+"""
+
+import multiprocessing
+
+# job function and state of the current worker process
+_function = None
+
+_state = None
+
+def _init_worker(function, initializer):
+    global _function, _state
+    _function = function
+    _state = initializer()
+
+def _run_job(job):
+    return _function(_state, job)
+
+def map_jobs(function, jobs, initializer, workers=1, chunksize=1,
+             ordered=True):
+    """Yield ``function(state, job)`` for each of ``jobs``, using
+    ``workers`` processes
+
+    ``state`` is the result of ``initializer()``, called once in every
+    process; it is closed at the end of a run in the calling process.
+    ``function`` and ``initializer`` have to be picklable (module
+    level functions or :func:`functools.partial` of them). The results
+    are yielded in the order of ``jobs``, or as they are finished if
+    ``ordered`` is false.
+    """
+    jobs = list(jobs)
+    if workers is None or workers <= 1 or len(jobs) <= 1:
+        state = initializer()
+        try:
+            for job in jobs:
+                yield function(state, job)
+        finally:
+            if state is not None:
+                state.close()
+        return
+    workers = min(workers, len(jobs))
+    pool = multiprocessing.Pool(
+            processes=workers,
+            initializer=_init_worker,
+            initargs=(function, initializer))
+    imap = pool.imap if ordered else pool.imap_unordered
+    try:
+        for result in imap(_run_job, jobs, chunksize=chunksize):
+            yield result
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Test the cache of extracted XML data
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import fitz
+
+from anapdf.cache import ExtractionCache, extraction_key, extraction_cache
+from anapdf.extraction import extract_xml, make_laparams
+
+def make_pdf(filename):
+    doc = fitz.open()
+    for fontname in ("helv", "tiro"):
+        page = doc.new_page(width=300, height=200)
+        page.insert_text((30, 60), u"Text in %s" % fontname,
+                         fontname=fontname, fontsize=12)
+    doc.save(filename)
+    doc.close()
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pdffile = os.path.join(self.directory, "test.pdf")
+        make_pdf(self.pdffile)
+        self.cachedir = os.path.join(self.directory, "cache")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_key(self):
+        key = extraction_key(self.pdffile, make_laparams("full"))
+        self.assertEqual(
+                extraction_key(self.pdffile, make_laparams("full")), key)
+        self.assertNotEqual(
+                extraction_key(self.pdffile, make_laparams("grid")), key)
+        self.assertNotEqual(
+                extraction_key(self.pdffile,
+                               make_laparams("full", char_margin=1.0)),
+                key)
+        self.assertNotEqual(
+                extraction_key(self.pdffile, make_laparams("full"),
+                               engine="pymupdf"), key)
+        corrector = os.path.join(self.directory, "corrector.py")
+        with open(corrector, "w") as f:
+            f.write("# no corrections\n")
+        self.assertNotEqual(
+                extraction_key(self.pdffile, make_laparams("full"),
+                               corrector_file=corrector), key)
+        # no layout analysis with PyMuPDF
+        self.assertEqual(
+                extraction_key(self.pdffile, make_laparams("full"),
+                               engine="pymupdf"),
+                extraction_key(self.pdffile, make_laparams("grid"),
+                               engine="pymupdf"))
+
+    def test_unknown_correctors(self):
+        self.assertEqual(
+                extraction_cache(self.pdffile, directory=self.cachedir,
+                                 font_correctors=[object()]),
+                (None, None))
+
+    def extract(self, cache, key):
+        outfp = io.BytesIO()
+        font_metrics = extract_xml(self.pdffile, outfp,
+                                   laparams=make_laparams("grid"),
+                                   cache=cache, cache_key=key)
+        return outfp.getvalue(), font_metrics
+
+    def test_hit(self):
+        cache, key = extraction_cache(self.pdffile, directory=self.cachedir,
+                                      laparams=make_laparams("grid"))
+        self.assertIsNone(cache.get(key))
+        xml, font_metrics = self.extract(cache, key)
+        entry = cache.get(key)
+        self.assertIsNotNone(entry)
+        entry[0].close()
+        self.assertEqual(self.extract(cache, key), (xml, font_metrics))
+
+    def store(self, cache, key, size, mtime):
+        fp = cache.create()
+        fp.write(os.urandom(size))
+        cache.store(key, fp, {})
+        for path in cache._paths(key):
+            os.utime(path, (mtime, mtime))
+
+    def test_eviction(self):
+        # room for two entries of 10 KB
+        cache = ExtractionCache(self.cachedir, max_size=25/1024.0)
+        self.store(cache, "a", 10240, 1000)
+        self.store(cache, "b", 10240, 2000)
+        # a used after b
+        cache.get("a")[0].close()
+        self.store(cache, "c", 10240, 3000)
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+
+    def test_interrupted(self):
+        cache = ExtractionCache(self.cachedir)
+        fp = cache.create()
+        fp.write(b"<pages>\n")
+        fp.close()
+        # metrics written, but the XML never renamed
+        metricspath = cache._paths("key")[1]
+        with open(metricspath + ".tmp", "w") as f:
+            f.write("{}")
+        self.assertIsNone(cache.get("key"))
+        cache.evict()
+        self.assertEqual(len(os.listdir(self.cachedir)), 2)
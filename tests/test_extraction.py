@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Test the extraction of pages within a time and memory budget
+"""
+
+import io
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+import fitz
+from lxml import etree as et
+
+from anapdf import extraction
+from anapdf.extraction import PageBudget, supervised_pages, extract_xml
+from anapdf.layout import GridLAParams
+
+#: behavior of the pages of StubExtractor, {idx: (full, grid)}
+BEHAVIOR = {}
+
+class StubExtractor(object):
+    """Stands in for the PDFMiner engine in the worker processes (they
+    are forked with :data:`BEHAVIOR` set)
+    """
+
+    def __init__(self, pdffile, font_correctors=None, laparams=None):
+        self.cheap = isinstance(laparams, GridLAParams)
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def extract(self, idx):
+        behavior = BEHAVIOR.get(idx, ("ok", "ok"))[self.cheap]
+        if behavior == "slow":
+            time.sleep(60)
+        elif behavior == "memory":
+            # beyond the limit of the worker
+            bytearray(2**31)
+        elif behavior == "error":
+            raise ValueError("broken page")
+        elif behavior == "crash":
+            os._exit(1)
+        return (b'<page id="%d" bbox="0,0,100,100" rotate="0">\n'
+                b'<textbox id="0"/>\n</page>\n' % (idx + 1)), \
+               {"F%d" % idx: {"bbox": (0, 0, 1, 1), "descent": 0}}
+
+
+class TestSupervisedPages(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pdffile = os.path.join(self.directory, "test.pdf")
+        doc = fitz.open()
+        for _ in range(3):
+            doc.new_page(width=100, height=100)
+        doc.save(self.pdffile)
+        doc.close()
+        self.engine = extraction.ENGINES["pdfminer"]
+        extraction.ENGINES["pdfminer"] = StubExtractor
+
+    def tearDown(self):
+        extraction.ENGINES["pdfminer"] = self.engine
+        BEHAVIOR.clear()
+        shutil.rmtree(self.directory)
+
+    def extract(self, budget):
+        pages = list(supervised_pages(
+            self.pdffile, range(3), budget=budget, workers=2))
+        self.assertEqual([idx for idx, xml, metrics in pages], [0, 1, 2])
+        return [et.fromstring(xml) for idx, xml, metrics in pages]
+
+    def test_within_budget(self):
+        budget = PageBudget(timeout=10)
+        pages = self.extract(budget)
+        self.assertEqual(budget.failures, [])
+        self.assertEqual([page.get("retried") for page in pages],
+                         [None]*3)
+
+    def test_timeout_retried(self):
+        BEHAVIOR[1] = ("slow", "ok")
+        budget = PageBudget(timeout=0.5)
+        pages = self.extract(budget)
+        self.assertEqual(budget.failures, [(1, "timeout", True)])
+        self.assertEqual(pages[1].get("retried"), "timeout")
+        self.assertEqual(len(pages[1]), 1)
+        self.assertIsNone(pages[0].get("retried"))
+
+    def test_timeout_empty(self):
+        BEHAVIOR[1] = ("slow", "slow")
+        budget = PageBudget(timeout=0.5)
+        pages = self.extract(budget)
+        self.assertEqual(budget.failures, [(1, "timeout", False)])
+        self.assertEqual(pages[1].get("status"), "timeout")
+        self.assertEqual(len(pages[1]), 0)
+        self.assertEqual(len(pages[2]), 1)
+
+    def test_no_retry(self):
+        BEHAVIOR[1] = ("slow", "ok")
+        budget = PageBudget(timeout=0.5, retry=False)
+        pages = self.extract(budget)
+        self.assertEqual(budget.failures, [(1, "timeout", False)])
+        self.assertEqual(pages[1].get("status"), "timeout")
+
+    def test_statuses(self):
+        BEHAVIOR[0] = ("memory", "memory")
+        BEHAVIOR[1] = ("error", "ok")
+        BEHAVIOR[2] = ("crash", "crash")
+        budget = PageBudget(timeout=10, memory=64)
+        pages = self.extract(budget)
+        self.assertEqual(sorted(budget.failures),
+                         [(0, "memory", False), (1, "error", True),
+                          (2, "crash", False)])
+        self.assertEqual([page.get("status") for page in pages],
+                         ["memory", None, "crash"])
+        self.assertEqual(pages[1].get("retried"), "error")
+
+
+class TestMuPDF(unittest.TestCase):
+
+    def test_subset_fontnames(self):
+        # PyMuPDF's global setting is restored after the extraction
+        directory = tempfile.mkdtemp()
+        try:
+            pdffile = os.path.join(directory, "test.pdf")
+            doc = fitz.open()
+            doc.new_page().insert_text((72, 72), u"Text")
+            doc.save(pdffile)
+            doc.close()
+            previous = bool(fitz.TOOLS.set_subset_fontnames())
+            extract_xml(pdffile, io.BytesIO(), engine="pymupdf")
+            self.assertEqual(bool(fitz.TOOLS.set_subset_fontnames()),
+                             previous)
+        finally:
+            shutil.rmtree(directory)
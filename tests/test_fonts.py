@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Test collecting the characters of the font index and reading the
+replacement table from it
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import fitz
+from lxml import etree as et
+
+from anapdf import Analyzer, fontenc
+
+XML = b"""<?xml version="1.0" encoding="UTF-8" ?>
+<pages>
+<page id="1" bbox="0.000,0.000,300.000,200.000" rotate="0">
+<textbox id="0" bbox="10.000,150.000,60.000,170.000">
+<textline bbox="10.000,150.000,60.000,170.000">
+<text font="ABCDEF+Serif" bbox="10.000,150.000,20.000,170.000" cid="65">A</text>
+<text font="ABCDEF+Serif" bbox="20.000,150.000,30.000,170.000" cid="66">b</text>
+<text> </text>
+<text font="ABCDEF+Serif" bbox="40.000,150.000,50.000,170.000" cid="65">A</text>
+<text font="ABCDEF+Serif-SC" bbox="50.000,150.000,60.000,170.000" cid="7" glyphname="a.sc">a</text>
+<text>
+</text>
+</textline>
+</textbox>
+<figure name="Im1" bbox="0.000,0.000,100.000,100.000">
+<text font="Sans" bbox="5.000,5.000,10.000,15.000" cid="3">x</text>
+</figure>
+</page>
+<page id="2" bbox="0.000,0.000,300.000,200.000" rotate="0">
+<textbox id="0" bbox="10.000,100.000,70.000,120.000">
+<textline bbox="10.000,100.000,70.000,120.000">
+<text font="ABCDEF+Serif" bbox="10.000,100.000,20.000,120.000" cid="66">b</text>
+<text font="ABCDEF+Serif" bbox="20.000,100.000,30.000,120.000" cid="67">c</text>
+<text font="Sans" bbox="30.000,100.000,40.000,120.000" cid="3">x</text>
+<text font="Sans" bbox="40.000,100.000,50.000,120.000" cid="4">y</text>
+</textline>
+</textbox>
+</page>
+<fonts>
+<font name="ABCDEF+Serif" bbox="-10,-200,1000,900" descent="-200" />
+<font name="Sans" bbox="0,-150,900,800" descent="-150" ascent="800" />
+</fonts>
+</pages>
+"""
+
+def make_analyzer(directory, **kwargs):
+    """Analyzer of a PDF file with two blank pages, its XML data being
+    :data:`XML`
+    """
+    pdffile = os.path.join(directory, "test.pdf")
+    doc = fitz.open()
+    for _ in range(2):
+        doc.new_page(width=300, height=200)
+    doc.save(pdffile)
+    doc.close()
+    xmlfile = os.path.join(directory, "test.xml")
+    with open(xmlfile, "wb") as f:
+        f.write(XML)
+    return Analyzer(pdffile=pdffile, outfilename=xmlfile,
+                    imdir=os.path.join(directory, "im"),
+                    fontdir=os.path.join(directory, "fonts"), **kwargs)
+
+def tree_collect(analyzer, xmlfile):
+    """``Analyzer.collect_fonts`` before it was streaming"""
+    fonts = {}
+    imgcount = 0
+    for page in et.parse(xmlfile).xpath("//page"):
+        for text in page.xpath(".//text"):
+            font = text.get("font")
+            if font is None:
+                continue
+            letters = fonts.setdefault(font, {})
+            txt = text.text or ""
+            letterref = (txt, text.get("cid", ""))
+            if txt in ("\n", "\r", "\r\n", "\n\r") or letterref in letters:
+                continue
+            letters[letterref] = {
+                "bbox": analyzer.blow_up_bbox(text.get("bbox")),
+                "page": int(page.get("id")),
+                "img": imgcount,
+                "sc": analyzer._is_smallcaps(text.get("glyphname", u"")),
+                "linebox": analyzer.blow_up_bbox(
+                    text.getparent().get("bbox", ""))}
+            imgcount += 1
+    return fonts
+
+
+class TestCollectFonts(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.analyzer = make_analyzer(self.directory)
+        self.xmlfile = self.analyzer.xmlfile
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_first_occurrence(self):
+        fonts = self.analyzer.collect_fonts(self.xmlfile)
+        self.assertEqual(sorted(fonts),
+                         ["ABCDEF+Serif", "ABCDEF+Serif-SC", "Sans"])
+        serif = fonts["ABCDEF+Serif"]
+        self.assertEqual(sorted(serif),
+                         [(u"A", "65"), (u"b", "66"), (u"c", "67")])
+        # A and b from page 1, the repetitions do not count
+        self.assertEqual(serif[(u"A", "65")], {
+            "bbox": "10.0,150.0,20.0,170.0", "page": 1, "img": 0,
+            "sc": False, "linebox": "10.0,150.0,60.0,170.0"})
+        self.assertEqual(serif[(u"b", "66")]["page"], 1)
+        self.assertEqual(serif[(u"c", "67")]["page"], 2)
+        self.assertTrue(fonts["ABCDEF+Serif-SC"][(u"a", "7")]["sc"])
+        # the box of the figure for characters outside textlines
+        self.assertEqual(fonts["Sans"][(u"x", "3")]["linebox"],
+                         "0.0,0.0,100.0,100.0")
+
+    def test_img_numbering(self):
+        fonts = self.analyzer.collect_fonts(self.xmlfile)
+        imgs = sorted((letter["img"], letter["page"])
+                      for letters in fonts.values()
+                      for letter in letters.values())
+        self.assertEqual(imgs, [(0, 1), (1, 1), (2, 1), (3, 1), (4, 2),
+                                (5, 2)])
+
+    def test_tree(self):
+        self.assertEqual(self.analyzer.collect_fonts(self.xmlfile),
+                         tree_collect(self.analyzer, self.xmlfile))
+
+    def test_font_metrics(self):
+        self.analyzer.font_metrics = None
+        self.analyzer.collect_fonts(self.xmlfile)
+        self.assertEqual(self.analyzer.font_metrics, {
+            "ABCDEF+Serif": {"bbox": (-10, -200, 1000, 900),
+                             "descent": -200},
+            "Sans": {"bbox": (0, -150, 900, 800), "descent": -150,
+                     "ascent": 800}})
+        # metrics of an extraction in this run are kept
+        self.analyzer.font_metrics = {}
+        self.analyzer.collect_fonts(self.xmlfile)
+        self.assertEqual(self.analyzer.font_metrics, {})
+
+    def test_font_index_pages(self):
+        self.assertEqual(self.analyzer.font_index_pages(self.xmlfile),
+                         [1, 2])
+
+
+class TestReadIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def index(self, name, **kwargs):
+        """Write the font index to directory ``name``, with ``b``
+        replaced by ``h`` as if edited by hand
+        """
+        analyzer = make_analyzer(self.directory, snippet_source="pdf",
+                                 resolution=72, **kwargs)
+        analyzer.fontdir = os.path.join(self.directory, name)
+        os.makedirs(analyzer.fontdir)
+        analyzer.extract_fonts()
+        for filename in os.listdir(analyzer.fontdir):
+            if not filename.endswith(".htm"):
+                continue
+            filename = os.path.join(analyzer.fontdir, filename)
+            doc = et.parse(filename, et.HTMLParser())
+            for tr in doc.xpath("//tr"):
+                if tr[2].text == u"b":
+                    tr[2].text = u"h"
+            doc.write(filename, method="html", encoding="UTF-8")
+        return os.path.join(analyzer.fontdir, "index.htm")
+
+    def test_split_index(self):
+        single = fontenc.read(self.index("single"))
+        self.assertEqual(single["ABCDEF+Serif"]["repl"],
+                         {(u"b", 66): (u"h", [])})
+        replchar, styles = single["ABCDEF+Serif-SC"]["repl"][(u"a", 7)]
+        self.assertEqual(replchar, u"a")
+        self.assertIn("sc", styles)
+        index = self.index("split", split_index=True)
+        with open(index, "rb") as f:
+            html = f.read()
+        self.assertNotIn(b"<table>", html)
+        # an anchor, not a page of the index
+        with open(index, "wb") as f:
+            f.write(html.replace(b"</p>",
+                                 b'<a href="#font9.htm">9</a></p>', 1))
+        self.assertEqual(fontenc.read(index), single)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Test resuming an interrupted XML extraction from its journal
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import fitz
+
+from anapdf import extraction, Analyzer
+from anapdf.extraction import extract_xml, make_laparams
+from anapdf.journal import ExtractionJournal
+
+FONTS = ("helv", "tiro", "cour", "tibo")
+
+def make_pdf(filename):
+    """Four pages, each with a font of its own"""
+    doc = fitz.open()
+    for fontname in FONTS:
+        page = doc.new_page(width=300, height=200)
+        page.insert_text((30, 60), u"Text in %s" % fontname,
+                         fontname=fontname, fontsize=12)
+    doc.save(filename)
+    doc.close()
+
+
+class Interrupted(Exception):
+    pass
+
+
+class RecordingExtractor(extraction.PageExtractor):
+    """The PDFMiner engine, recording the extracted pages and
+    interrupted at page :attr:`stop`
+    """
+
+    stop = None
+    extracted = []
+
+    def extract(self, idx):
+        if idx == RecordingExtractor.stop:
+            raise Interrupted()
+        RecordingExtractor.extracted.append(idx)
+        return extraction.PageExtractor.extract(self, idx)
+
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.journaldir = os.path.join(self.directory, "journal")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_resume(self):
+        journal = ExtractionJournal(self.journaldir, "key")
+        journal.add(0, b"<page/>\n", {"F": {"bbox": [0, 0, 1, 1]}})
+        journal = ExtractionJournal(self.journaldir, "key")
+        self.assertIn(0, journal)
+        self.assertNotIn(1, journal)
+        self.assertEqual(journal.get(0),
+                         (b"<page/>\n", {"F": {"bbox": (0, 0, 1, 1)}}))
+
+    def test_other_key(self):
+        journal = ExtractionJournal(self.journaldir, "key")
+        journal.add(0, b"<page/>\n", {})
+        journal = ExtractionJournal(self.journaldir, "other")
+        self.assertNotIn(0, journal)
+
+    def test_discard(self):
+        journal = ExtractionJournal(self.journaldir, "key")
+        journal.add(0, b"<page/>\n", {})
+        journal = ExtractionJournal(self.journaldir, "key", discard=True)
+        self.assertNotIn(0, journal)
+        self.assertTrue(os.path.isdir(self.journaldir))
+
+
+class TestResumedExtraction(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pdffile = os.path.join(self.directory, "test.pdf")
+        make_pdf(self.pdffile)
+        self.engine = extraction.ENGINES["pdfminer"]
+        extraction.ENGINES["pdfminer"] = RecordingExtractor
+        RecordingExtractor.extracted = []
+        RecordingExtractor.stop = None
+
+    def tearDown(self):
+        extraction.ENGINES["pdfminer"] = self.engine
+        shutil.rmtree(self.directory)
+
+    def extract(self, journal=None):
+        outfp = io.BytesIO()
+        # grid: the same layout in every run
+        font_metrics = extract_xml(self.pdffile, outfp,
+                                   laparams=make_laparams("grid"),
+                                   journal=journal)
+        return outfp.getvalue(), font_metrics
+
+    def test_resume(self):
+        xml, font_metrics = self.extract()
+        self.assertEqual(len(font_metrics), len(FONTS))
+        journaldir = os.path.join(self.directory, "journal")
+        RecordingExtractor.extracted = []
+        RecordingExtractor.stop = 2
+        with self.assertRaises(Interrupted):
+            self.extract(ExtractionJournal(journaldir, "key"))
+        self.assertEqual(RecordingExtractor.extracted, [0, 1])
+        RecordingExtractor.extracted = []
+        RecordingExtractor.stop = None
+        resumed, resumed_metrics = self.extract(
+                ExtractionJournal(journaldir, "key"))
+        self.assertEqual(RecordingExtractor.extracted, [2, 3])
+        # the <fonts> section with the metrics of all pages
+        self.assertEqual(resumed, xml)
+        self.assertEqual(resumed_metrics, font_metrics)
+        self.assertFalse(os.path.exists(journaldir))
+
+
+class TestAnalyzerJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pdffile = os.path.join(self.directory, "test.pdf")
+        make_pdf(self.pdffile)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def journal(self, **kwargs):
+        return Analyzer(pdffile=self.pdffile,
+                        imdir=os.path.join(self.directory, "im"),
+                        fontdir=os.path.join(self.directory, "fonts"),
+                        **kwargs).extraction_journal()
+
+    def test_journal(self):
+        self.assertIsNotNone(self.journal())
+        self.assertIsNone(self.journal(journal=False))
+
+    def test_unknown_correctors(self):
+        # the key cannot tell these correctors from others
+        self.assertIsNone(self.journal(font_correctors=[object()]))
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Test the grid layout analysis against PDFMiner's
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import fitz
+from lxml import etree as et
+
+from anapdf.extraction import PageExtractor, make_laparams
+from anapdf.layout import reading_order
+
+WORDS = (u"lorem ipsum dolor sit amet consectetur adipiscing elit sed do "
+         u"eiusmod tempor incididunt ut labore et dolore magna aliqua").split()
+
+def paragraph(n, length):
+    return u" ".join(WORDS[(n*7 + i) % len(WORDS)] for i in range(length))
+
+def make_pdf(filename, columns):
+    """A page with a title and three paragraphs in each of ``columns``
+    columns
+    """
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    page.insert_text((72, 80), u"The Title of the Page", fontsize=16)
+    width = (451 - (columns - 1)*30)/columns
+    n = 0
+    for column in range(columns):
+        x0 = 72 + column*(width + 30)
+        y = 120
+        for _ in range(3):
+            rect = fitz.Rect(x0, y, x0 + width, y + 120)
+            page.insert_textbox(rect, paragraph(n, 40), fontsize=10)
+            n += 1
+            y += 150
+    doc.save(filename)
+    doc.close()
+
+def boxes(pdffile, layout):
+    """The texts of the lines of each text box, in the order of the
+    box ids
+    """
+    extractor = PageExtractor(pdffile, laparams=make_laparams(layout))
+    xml, metrics = extractor.extract(0)
+    extractor.close()
+    page = et.fromstring(xml)
+    ret = []
+    for textbox in sorted(page.findall("textbox"),
+                          key=lambda e: int(e.get("id"))):
+        ret.append([u"".join(t.text for t in textline.findall("text"))
+                    for textline in textbox.findall("textline")])
+    return ret
+
+
+class TestGridLayout(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def compare(self, columns):
+        pdffile = os.path.join(self.directory, "test.pdf")
+        make_pdf(pdffile, columns)
+        full = boxes(pdffile, "full")
+        grid = boxes(pdffile, "grid")
+        self.assertEqual(len(grid), 1 + 3*columns)
+        self.assertEqual(grid, full)
+
+    def test_one_column(self):
+        self.compare(1)
+
+    def test_two_columns(self):
+        self.compare(2)
+
+    def test_lines_mode(self):
+        pdffile = os.path.join(self.directory, "test.pdf")
+        make_pdf(pdffile, 2)
+        extractor = PageExtractor(pdffile, laparams=make_laparams("lines"))
+        xml, metrics = extractor.extract(0)
+        extractor.close()
+        ids = [int(e.get("id"))
+               for e in et.fromstring(xml).findall("textbox")]
+        self.assertEqual(ids, list(range(7)))
+        lines = boxes(pdffile, "lines")
+        self.assertEqual(lines[0], [u"The Title of the Page\n"])
+        # the same boxes, by position: both columns paragraph by paragraph
+        self.assertEqual(sorted(lines), sorted(boxes(pdffile, "grid")))
+
+    def test_lines(self):
+        pdffile = os.path.join(self.directory, "test.pdf")
+        make_pdf(pdffile, 2)
+        lines = lambda b: sorted(line for box in b for line in box)
+        self.assertEqual(lines(boxes(pdffile, "grid")),
+                         lines(boxes(pdffile, "lines")))
+
+
+class Box(object):
+
+    def __init__(self, name, x0, y0, x1, y1):
+        self.name = name
+        self.x0, self.y0, self.x1, self.y1 = x0, y0, x1, y1
+
+
+class TestReadingOrder(unittest.TestCase):
+
+    def test_columns(self):
+        boxes = [Box("right", 300, 100, 500, 700),
+                 Box("footer", 50, 20, 500, 40),
+                 Box("left", 50, 100, 250, 700),
+                 Box("header", 50, 750, 500, 780)]
+        self.assertEqual([box.name for box in reading_order(boxes)],
+                         ["header", "left", "right", "footer"])
+
+    def test_table(self):
+        boxes = [Box("%d%d" % (row, col), col*100, 700 - row*20,
+                     col*100 + 80, 700 - row*20 + 10)
+                 for col in range(3) for row in range(3)]
+        self.assertEqual([box.name for box in reading_order(boxes)],
+                         ["00", "01", "02", "10", "11", "12",
+                          "20", "21", "22"])
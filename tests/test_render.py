@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Test writing the embedded scans of pages and skipping up to date page
+images
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import fitz
+from PIL import Image
+
+from anapdf import Analyzer
+from anapdf.render import PageRenderer
+
+def make_pdf(filename, filt=None):
+    """A page that is a single scan of 400 x 200 pixels, the stream of
+    the scan replaced by data that cannot be decoded if ``filt`` is
+    given
+    """
+    doc = fitz.open()
+    page = doc.new_page(width=200, height=100)
+    buf = io.BytesIO()
+    Image.new("L", (400, 200), 255).save(buf, "PNG")
+    page.insert_image(page.rect, stream=buf.getvalue())
+    if filt is not None:
+        xref = page.get_images(full=True)[0][0]
+        doc.update_stream(xref, b"\x00\x01garbage"*10, compress=False)
+        doc.xref_set_key(xref, "Filter", "/" + filt)
+        doc.xref_set_key(xref, "DecodeParms", "null")
+    doc.save(filename)
+    doc.close()
+
+
+class TestEmbeddedScan(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pdffile = os.path.join(self.directory, "test.pdf")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def render(self, image_format):
+        renderer = PageRenderer(self.pdffile, self.directory,
+                                resolution=72, image_format=image_format,
+                                colormode="gray", embedded=True)
+        try:
+            name, info = renderer.render(0)
+        finally:
+            renderer.close()
+        with Image.open(name) as im:
+            size = im.size
+        return info, size
+
+    def test_embedded(self):
+        make_pdf(self.pdffile)
+        info, size = self.render("png")
+        self.assertEqual(info["source"], "embedded")
+        self.assertEqual(size, (400, 200))
+
+    def test_undecodable(self):
+        # extracted as JPEG, but neither copied nor decoded
+        make_pdf(self.pdffile, "DCTDecode")
+        for image_format in ("jpeg", "png"):
+            info, size = self.render(image_format)
+            self.assertNotIn("source", info)
+            self.assertEqual(size, (200, 100))
+
+    def test_unextractable(self):
+        make_pdf(self.pdffile, "JPXDecode")
+        info, size = self.render("png")
+        self.assertNotIn("source", info)
+        self.assertEqual(size, (200, 100))
+
+
+class TestManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pdffile = os.path.join(self.directory, "test.pdf")
+        doc = fitz.open()
+        for _ in range(3):
+            doc.new_page(width=100, height=100)
+        doc.save(self.pdffile)
+        doc.close()
+        self.imdir = os.path.join(self.directory, "im")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def images(self, **kwargs):
+        """Indexes of the pages rendered with ``kwargs``"""
+        settings = dict(pdffile=self.pdffile, imdir=self.imdir,
+                        fontdir=os.path.join(self.directory, "fonts"),
+                        resolution=72)
+        settings.update(kwargs)
+        return list(Analyzer(**settings).images())
+
+    def test_unchanged(self):
+        self.assertEqual(self.images(), [0, 1, 2])
+        self.assertEqual(self.images(), [])
+
+    def test_settings(self):
+        for kwargs in ({"resolution": 36}, {"image_format": "png"},
+                       {"colormode": "gray"}, {"pyramid": "dzi"}):
+            self.imdir = os.path.join(self.directory, "".join(kwargs))
+            self.images()
+            self.assertEqual(self.images(**kwargs), [0, 1, 2], kwargs)
+            self.assertEqual(self.images(**kwargs), [], kwargs)
+
+    def test_deleted(self):
+        self.images()
+        os.remove(os.path.join(self.imdir, "test_00002.jpg"))
+        self.assertEqual(self.images(), [1])
+
+    def test_force(self):
+        self.images()
+        self.assertEqual(self.images(force_images=True), [0, 1, 2])
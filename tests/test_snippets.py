@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Test packing the snippets of the font index into atlas sheets
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+import fitz
+from PIL import Image
+
+from anapdf import snippets, Analyzer
+from anapdf.snippets import pack_atlas
+
+class TestPackAtlas(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.height = snippets.ATLAS_HEIGHT
+        snippets.ATLAS_HEIGHT = 450
+
+    def tearDown(self):
+        snippets.ATLAS_HEIGHT = self.height
+        shutil.rmtree(self.directory)
+
+    def test_sheets(self):
+        # one snippet per row, four rows per sheet
+        filenames = []
+        for i in range(10):
+            filename = os.path.join(self.directory, "%d.png" % i)
+            Image.new("RGB", (1800, 100), (i*20, 0, 0)).save(filename)
+            filenames.append(filename)
+        atlasname = os.path.join(self.directory, "atlas_%d.png")
+        boxes, sizes = pack_atlas(filenames, atlasname)
+        self.assertEqual([box[0] for box in boxes],
+                         [0]*4 + [1]*4 + [2]*2)
+        self.assertEqual(sizes, [(1800, 400), (1800, 400), (1800, 200)])
+        for i, (sheet, x, y, w, h) in enumerate(boxes):
+            with Image.open(atlasname % sheet) as atlas:
+                self.assertEqual(atlas.size, sizes[sheet])
+                self.assertEqual(atlas.getpixel((x + 5, y + 5)),
+                                 (i*20, 0, 0))
+
+    def test_higher_snippet(self):
+        filenames = []
+        for i, h in enumerate((100, 600, 100)):
+            filename = os.path.join(self.directory, "%d.png" % i)
+            Image.new("RGB", (1800, h), "black").save(filename)
+            filenames.append(filename)
+        boxes, sizes = pack_atlas(
+                filenames, os.path.join(self.directory, "atlas_%d.png"))
+        self.assertEqual(boxes, [(0, 0, 0, 1800, 100), (1, 0, 0, 1800, 600),
+                                 (2, 0, 0, 1800, 100)])
+
+
+class TestAtlasIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pdffile = os.path.join(self.directory, "test.pdf")
+        doc = fitz.open()
+        page = doc.new_page(width=600, height=200)
+        page.insert_text((20, 60), u"ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+                         fontname="helv", fontsize=12)
+        doc.save(self.pdffile)
+        doc.close()
+        self.height = snippets.ATLAS_HEIGHT
+        snippets.ATLAS_HEIGHT = 30
+
+    def tearDown(self):
+        snippets.ATLAS_HEIGHT = self.height
+        shutil.rmtree(self.directory)
+
+    def test_sheets(self):
+        fontdir = os.path.join(self.directory, "fonts")
+        Analyzer(pdffile=self.pdffile, atlas=True, cache=False,
+                 imdir=os.path.join(self.directory, "im"),
+                 fontdir=fontdir, resolution=72).analyze()
+        with open(os.path.join(fontdir, "index.htm")) as f:
+            index = f.read()
+        urls = re.findall(r"url\(pic/([^)]*)\)", index)
+        self.assertEqual(len(urls), 2*26)
+        sheets = set(urls)
+        self.assertIn("font0_lines_1.jpg", sheets)
+        for sheet in sheets:
+            with Image.open(os.path.join(fontdir, "pic", sheet)) as atlas:
+                self.assertLessEqual(atlas.size[1], 30)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Test distributing jobs to worker processes
+"""
+
+import os
+import unittest
+
+from anapdf.workers import map_jobs
+
+class State(object):
+
+    closed = []
+
+    def __init__(self):
+        self.pid = os.getpid()
+
+    def close(self):
+        State.closed.append(self.pid)
+
+
+def square(state, job):
+    return job*job, state.pid
+
+
+class TestMapJobs(unittest.TestCase):
+
+    def setUp(self):
+        State.closed = []
+
+    def test_serial(self):
+        results = list(map_jobs(square, range(5), State))
+        self.assertEqual(results, [(i*i, os.getpid()) for i in range(5)])
+        self.assertEqual(State.closed, [os.getpid()])
+
+    def test_workers(self):
+        results = list(map_jobs(square, range(20), State, workers=3,
+                                chunksize=2))
+        self.assertEqual([value for value, pid in results],
+                         [i*i for i in range(20)])
+        self.assertNotIn(os.getpid(), set(pid for value, pid in results))
+
+    def test_unordered(self):
+        results = map_jobs(square, range(20), State, workers=3,
+                           ordered=False)
+        self.assertEqual(sorted(value for value, pid in results),
+                         [i*i for i in range(20)])